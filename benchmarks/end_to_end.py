@@ -0,0 +1,319 @@
+"""
+Run the features of a session end to end against the replay server and
+report, per feature and list size, the wall time, the WebDriver round trips,
+the SQLite statements and the peak RSS of the browser processes
+
+The browser is headless and the features run on a virtual clock, so their
+sleeps don't block: the wall time is the engine's own and the pacing is
+reported apart as the simulated sleep. Sleeps inside socialcommons helpers
+are not virtual.
+
+The results are printed as a table and written as JSON lines, one per
+feature and size, tagged with the commit they were measured at; give the
+file of another commit as `--baseline` to print the ratios against it.
+
+Usage:
+    python benchmarks/end_to_end.py --rows 10 100 1000 --output results.jsonl
+    python benchmarks/end_to_end.py --rows 100 --baseline results.jsonl
+"""
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+import time
+
+from replay_server import ReplayServer
+
+from facebookpy import FacebookPy
+from facebookpy.clock import set_clock
+from facebookpy.clock import VirtualClock
+
+FEATURES = [
+    "get_recent_friends",
+    "confirm_friends",
+    "add_members_of_group",
+    "follow_user_followers",
+    "follow_likers",
+    "interact_by_users",
+    "invite_friends_to_page",
+    "withdraw_outgoing_friends_requests",
+]
+
+
+def feature_calls(rows, visits):
+    """ The arguments each feature runs with, for lists of `rows` rows;
+    `visits` bounds the profiles visited one by one """
+    people = ["person{}".format(i) for i in range(1, min(rows, visits) + 1)]
+    return {
+        "get_recent_friends": ((), {}),
+        "confirm_friends": ((), {"max_confirms": rows}),
+        "add_members_of_group": (("replay_group",), {"max_add": rows}),
+        "follow_user_followers": ((["person1"],), {"amount": min(rows, visits)}),
+        "follow_likers": (
+            (["person1"],),
+            {"photos_grab_amount": 3, "follow_likers_per_photo": min(rows, visits)},
+        ),
+        "interact_by_users": ((people[:3],), {"amount": min(rows, visits)}),
+        "invite_friends_to_page": ((people, "Replay Page"), {}),
+        "withdraw_outgoing_friends_requests": ((), {"ignore_few": False}),
+    }
+
+
+class CommandCounter:
+    """ Count the WebDriver commands of the browser, on top of whatever
+    wraps its `execute()` already """
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.commands = 0
+        self.execute = None
+
+    def __enter__(self):
+        self.execute = self.browser.execute
+
+        def counted(*args, **kwargs):
+            self.commands += 1
+            return self.execute(*args, **kwargs)
+
+        self.browser.execute = counted
+        return self
+
+    def __exit__(self, *exc):
+        self.browser.execute = self.execute
+
+
+class StatementCounter:
+    """ Count the statements run by the SQLite connections opened while
+    installed """
+
+    def __init__(self):
+        self.statements = 0
+        self.connect = None
+
+    def count(self, statement):
+        self.statements += 1
+
+    def install(self):
+        self.connect = sqlite3.connect
+
+        def traced_connect(*args, **kwargs):
+            conn = self.connect(*args, **kwargs)
+            conn.set_trace_callback(self.count)
+            return conn
+
+        sqlite3.connect = traced_connect
+        return self
+
+    def uninstall(self):
+        sqlite3.connect = self.connect
+
+
+def process_tree(root_pid):
+    """ Return the pid of the process and of all its descendants, read from
+    /proc; the driver process is the root of the browser ones """
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open("/proc/{}/stat".format(entry)) as stat:
+                # the command name may hold spaces, the fields after it don't
+                ppid = int(stat.read().rsplit(")", 1)[1].split()[1])
+        except (IOError, OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    pids = [root_pid]
+    for pid in pids:
+        pids.extend(children.get(pid, []))
+    return pids
+
+
+def resident_kb(pid):
+    try:
+        with open("/proc/{}/status".format(pid)) as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except (IOError, OSError):
+        pass
+    return 0
+
+
+class RssSampler:
+    """ Sample the total RSS of the browser processes in the background and
+    keep the peak """
+
+    def __init__(self, root_pid, interval=0.2):
+        self.root_pid = root_pid
+        self.interval = interval
+        self.peak_kb = 0
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        total = sum(resident_kb(pid) for pid in process_tree(self.root_pid))
+        self.peak_kb = max(self.peak_kb, total)
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.sample()
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopping.set()
+        self.thread.join()
+        self.sample()
+
+
+def current_commit():
+    try:
+        return (
+            subprocess.check_output(["git", "rev-parse", "--short", "HEAD"])
+            .decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_size(rows, args, statements):
+    """ Run the features against lists of `rows` rows in a fresh session """
+    server = ReplayServer(rows, args.page_size).start()
+    # a profile of its own, so no restriction of a previous run applies
+    session = FacebookPy(
+        username="replay_{}_{}".format(rows, int(time.time())),
+        password="replay",
+        headless_browser=True,
+        use_firefox=args.browser == "firefox",
+        show_logs=args.show_logs,
+        replay_address=server.address,
+    )
+    session.set_do_follow(enabled=True, percentage=100)
+    root_pid = session.browser.service.process.pid
+
+    results = []
+    try:
+        calls = feature_calls(rows, args.visits)
+        for name in args.features:
+            feature_args, feature_kwargs = calls[name]
+            statements.statements = 0
+
+            clock = VirtualClock()
+            previous_clock = set_clock(clock)
+            try:
+                with CommandCounter(session.browser) as commands, RssSampler(
+                    root_pid
+                ) as rss:
+                    start = time.time()
+                    getattr(session, name)(*feature_args, **feature_kwargs)
+                    wall_time = time.time() - start
+            finally:
+                set_clock(previous_clock)
+
+            results.append(
+                {
+                    "commit": args.commit,
+                    "feature": name,
+                    "rows": rows,
+                    "wall_time": round(wall_time, 3),
+                    "simulated_sleep": round(clock.slept, 3),
+                    "webdriver_commands": commands.commands,
+                    "sqlite_statements": statements.statements,
+                    "peak_browser_rss_kb": rss.peak_kb,
+                }
+            )
+    finally:
+        session.end()
+        server.stop()
+
+    return results
+
+
+def load_baseline(path):
+    baseline = {}
+    with open(path) as lines:
+        for line in lines:
+            result = json.loads(line)
+            baseline[(result["feature"], result["rows"])] = result
+    return baseline
+
+
+def ratio(value, base):
+    return "{:.2f}x".format(value / float(base)) if base else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--features", nargs="+", choices=FEATURES, default=FEATURES)
+    parser.add_argument(
+        "--visits",
+        type=int,
+        default=50,
+        help="most profiles visited one by one per feature",
+    )
+    parser.add_argument("--browser", choices=["firefox", "chrome"], default="firefox")
+    parser.add_argument("--output", help="JSON lines file to append the results to")
+    parser.add_argument("--baseline", help="JSON lines results of another commit")
+    parser.add_argument("--show-logs", action="store_true")
+    args = parser.parse_args()
+    args.commit = current_commit()
+
+    statements = StatementCounter().install()
+    results = []
+    try:
+        for rows in args.rows:
+            results.extend(run_size(rows, args, statements))
+    finally:
+        statements.uninstall()
+
+    if args.output:
+        with open(args.output, "a") as output:
+            for result in results:
+                output.write(json.dumps(result, sort_keys=True) + "\n")
+
+    baseline = load_baseline(args.baseline) if args.baseline else {}
+    print(
+        "{:<36} {:>6} {:>9} {:>10} {:>9} {:>8} {:>10}".format(
+            "feature", "rows", "wall", "slept", "commands", "queries", "peak RSS"
+        )
+    )
+    for result in results:
+        print(
+            "{:<36} {:>6} {:>8.2f}s {:>9.0f}s {:>9} {:>8} {:>7} MB".format(
+                result["feature"],
+                result["rows"],
+                result["wall_time"],
+                result["simulated_sleep"],
+                result["webdriver_commands"],
+                result["sqlite_statements"],
+                result["peak_browser_rss_kb"] // 1024,
+            )
+        )
+        base = baseline.get((result["feature"], result["rows"]))
+        if base:
+            print(
+                "{:<36} {:>6} {:>9} {:>10} {:>9} {:>8} {:>10}".format(
+                    "  vs {}".format(base["commit"]),
+                    "",
+                    ratio(result["wall_time"], base["wall_time"]),
+                    "",
+                    ratio(result["webdriver_commands"], base["webdriver_commands"]),
+                    ratio(result["sqlite_statements"], base["sqlite_statements"]),
+                    ratio(result["peak_browser_rss_kb"], base["peak_browser_rss_kb"]),
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
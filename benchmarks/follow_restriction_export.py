@@ -0,0 +1,105 @@
+"""
+Benchmark the follow restriction export of `session.end()`: the full JSON
+rewrite it used to do against the incremental NDJSON append
+
+Usage:
+    python benchmarks/follow_restriction_export.py --rows 100000 --changed 100
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from facebookpy import database_engine
+from facebookpy.database_engine import get_database
+from facebookpy.database_engine import get_connection
+from facebookpy.database_engine import close_connections
+from facebookpy.database_engine import UPSERT_FOLLOW_RESTRICTION
+from facebookpy.settings import Settings
+from facebookpy.unfollow_util import dump_follow_restriction
+
+
+def populate(address, rows):
+    conn = sqlite3.connect(address)
+    with conn:
+        conn.executemany(
+            "INSERT INTO followRestriction (profile_id, username, times, revision) "
+            "VALUES (1, ?, 1, ?)",
+            (("user{}".format(i), i + 1) for i in range(rows)),
+        )
+    conn.close()
+
+
+def dump_full(address, logfolder):
+    """ What `dump_follow_restriction()` did before: read the whole table
+    and rewrite the JSON """
+    conn = get_connection(address)
+    with conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM followRestriction WHERE profile_id=1")
+        data = cur.fetchall()
+
+    current_data = {"benchmark": {row["username"]: row["times"] for row in data}}
+    with open("{}followRestriction.json".format(logfolder), "w") as frFile:
+        json.dump(current_data, frFile)
+
+
+def follow(address, changed):
+    conn = get_connection(address)
+    with conn:
+        for i in range(changed):
+            conn.execute(UPSERT_FOLLOW_RESTRICTION, (1, "user{}".format(i)))
+
+
+def run(name, func):
+    start = time.time()
+    func()
+    elapsed = time.time() - start
+    print("{:<12} {:>7.3f}s".format(name, elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--changed", type=int, default=100)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    logfolder = workdir + os.sep
+    logger = logging.getLogger(__name__)
+    try:
+        Settings.DATABASE_LOCATION = os.path.join(workdir, "facebookpy.db")
+        Settings.logger = logger
+        Settings.profile = {"id": None, "name": "benchmark"}
+        database_engine.resolved_databases.clear()
+        address, _ = get_database(Settings, make=True)
+        populate(address, args.rows)
+
+        print(
+            "{} followed users, {} followed again in the session".format(
+                args.rows, args.changed
+            )
+        )
+        # the first export has to write the whole history either way
+        run(
+            "first dump",
+            lambda: dump_follow_restriction("benchmark", logger, logfolder),
+        )
+
+        follow(address, args.changed)
+        run("full", lambda: dump_full(address, logfolder))
+        run(
+            "incremental",
+            lambda: dump_follow_restriction("benchmark", logger, logfolder),
+        )
+    finally:
+        close_connections()
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
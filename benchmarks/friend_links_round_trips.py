@@ -0,0 +1,121 @@
+"""
+Count the WebDriver round trips of scraping a friends list anchor by anchor
+against the single script run of `extract_links()`
+
+Usage:
+    python benchmarks/friend_links_round_trips.py --friends 2000 --browser firefox
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from selenium import webdriver
+
+from facebookpy.browser_util import extract_links
+from facebookpy.selectors import Selectors
+
+FRIEND_ROW = """
+    <li><div><div><div class="uiProfileBlockContent"><div>
+        <div>status</div>
+        <div><a href="{href}" data-hovercard="/ajax/hovercard/user.php?id={id}">{name}</a></div>
+    </div></div></div></div></li>"""
+
+
+def write_friends_list(path, friends):
+    rows = []
+    for i in range(friends):
+        # every tenth friend has no username
+        if i % 10:
+            href = "https://www.facebook.com/friend{}?fref=pb".format(i)
+        else:
+            href = "https://www.facebook.com/profile.php?id={}&fref=pb".format(i)
+        rows.append(FRIEND_ROW.format(href=href, id=i, name="Friend {}".format(i)))
+
+    with open(path, "w") as page:
+        page.write("<html><body><ul>{}</ul></body></html>".format("".join(rows)))
+
+
+class CommandCounter:
+    """ Count the WebDriver commands sent by a browser """
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.commands = 0
+
+    def __enter__(self):
+        execute = self.browser.execute
+
+        def counted(*args, **kwargs):
+            self.commands += 1
+            return execute(*args, **kwargs)
+
+        self.browser.execute = counted
+        return self
+
+    def __exit__(self, *exc):
+        del self.browser.execute
+
+
+def scrape_per_anchor(browser):
+    """ What the friend list scrapers did before """
+    friend_elems = browser.find_elements_by_css_selector(Selectors.friend_links_css)
+    return [
+        friend_elem.get_attribute("href").split("?")[0].split("/")[3]
+        for friend_elem in friend_elems
+    ]
+
+
+def scrape_scripted(browser):
+    return [
+        link["username"] or "profile.php"
+        for link in extract_links(browser, Selectors.friend_links_css)
+    ]
+
+
+def run(name, func, browser):
+    with CommandCounter(browser) as counter:
+        start = time.time()
+        friends = func(browser)
+        elapsed = time.time() - start
+
+    print(
+        "{:<11} {:>6} friends in {:>7.3f}s with {:>6} round trips".format(
+            name, len(friends), elapsed, counter.commands
+        )
+    )
+    return friends
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--friends", type=int, default=2000)
+    parser.add_argument("--browser", choices=["firefox", "chrome"], default="firefox")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    page = os.path.join(workdir, "friends_recent.html")
+    write_friends_list(page, args.friends)
+
+    if args.browser == "firefox":
+        options = webdriver.FirefoxOptions()
+        options.add_argument("-headless")
+        browser = webdriver.Firefox(options=options)
+    else:
+        options = webdriver.ChromeOptions()
+        options.add_argument("--headless")
+        browser = webdriver.Chrome(options=options)
+
+    try:
+        browser.get("file://" + page)
+        before = run("per-anchor", scrape_per_anchor, browser)
+        after = run("scripted", scrape_scripted, browser)
+        assert before == after, "both scrapers must collect the same friends"
+    finally:
+        browser.quit()
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
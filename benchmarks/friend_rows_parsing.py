@@ -0,0 +1,123 @@
+"""
+Time parsing the rows of a group members list row by row, as
+`process_rows_and_add_by_visiting()` did, against `parse_friend_rows()`
+
+The old parsing also slept `delay_random` after each collected row; that
+pacing is reported separately instead of being slept.
+
+Usage:
+    python benchmarks/friend_rows_parsing.py --rows 50 --sleep-delay 6
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from selenium import webdriver
+
+from facebookpy.browser_util import parse_friend_rows
+
+MEMBER_ROW = """
+    <div id="things_in_common_{id}">
+        <a href="{href}">Member {id}</a>
+        <div class="FriendButton">
+            <button class="FriendRequestAdd addButton{hidden}">{button}</button>
+        </div>
+    </div>"""
+
+
+def write_members_list(path, rows):
+    members = []
+    for i in range(rows):
+        if i % 10:
+            href = "https://www.facebook.com/member{}?fref=gm".format(i)
+        else:
+            href = "https://www.facebook.com/profile.php?id={}&fref=gm".format(i)
+        members.append(
+            MEMBER_ROW.format(
+                id=i,
+                href=href,
+                hidden=" hidden_elem" if i % 7 == 0 else "",
+                button="Friend Request Sent" if i % 5 == 0 else "Add Friend",
+            )
+        )
+
+    with open(path, "w") as page:
+        page.write("<html><body>{}</body></html>".format("".join(members)))
+
+
+def parse_per_row(browser, rows):
+    """ The WebDriver calls the rows were parsed with before """
+    userids = []
+    for row in rows:
+        btn = row.find_element_by_css_selector(
+            "div.FriendButton > button.FriendRequestAdd.addButton"
+        )
+        if btn.text.strip() != "Add Friend":
+            continue
+        if "hidden_elem" in btn.get_attribute("class"):
+            continue
+        prof_link = row.find_element_by_css_selector("a")
+        userid = prof_link.get_attribute("href").split("?")[0].split("/")[3]
+        if userid == "profile.php":
+            continue
+        userids.append(userid)
+    return userids
+
+
+def parse_scripted(browser, rows):
+    return [
+        record["username"]
+        for record in parse_friend_rows(browser, rows)
+        if record["button"] == "Add Friend"
+        and not record["hidden"]
+        and record["username"]
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--sleep-delay", type=int, default=6)
+    parser.add_argument("--browser", choices=["firefox", "chrome"], default="firefox")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    page = os.path.join(workdir, "members_with_things_in_common.html")
+    write_members_list(page, args.rows)
+
+    if args.browser == "firefox":
+        options = webdriver.FirefoxOptions()
+        options.add_argument("-headless")
+        browser = webdriver.Firefox(options=options)
+    else:
+        options = webdriver.ChromeOptions()
+        options.add_argument("--headless")
+        browser = webdriver.Chrome(options=options)
+
+    try:
+        browser.get("file://" + page)
+        rows = browser.find_elements_by_css_selector("div[id^='things_in_common_']")
+
+        for name, func in [("per-row", parse_per_row), ("scripted", parse_scripted)]:
+            start = time.time()
+            userids = func(browser, rows)
+            print(
+                "{:<9} {:>5} rows -> {:>5} to add in {:>8.3f}s".format(
+                    name, len(rows), len(userids), time.time() - start
+                )
+            )
+
+        print(
+            "the per-row parsing also slept ~{}s in between".format(
+                len(userids) * args.sleep_delay
+            )
+        )
+    finally:
+        browser.quit()
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
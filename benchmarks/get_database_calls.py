@@ -0,0 +1,98 @@
+"""
+Count the filesystem checks and time of `get_database()` on the hot path
+
+Usage:
+    python benchmarks/get_database_calls.py --calls 100000
+"""
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from facebookpy import database_engine
+from facebookpy.database_engine import get_database
+from facebookpy.database_engine import validate_database_address
+from facebookpy.database_engine import create_database
+from facebookpy.database_engine import get_profile
+from facebookpy.settings import Settings
+
+
+class PathCallCounter:
+    """ Count the calls of the `os.path` checks used by the DB helpers """
+
+    names = ["exists", "isfile"]
+
+    def __init__(self):
+        self.calls = 0
+        self.originals = {}
+
+    def __enter__(self):
+        for name in self.names:
+            original = self.originals[name] = getattr(os.path, name)
+            setattr(os.path, name, self.counted(original))
+        return self
+
+    def __exit__(self, *exc):
+        for name, original in self.originals.items():
+            setattr(os.path, name, original)
+
+    def counted(self, func):
+        def wrapper(*args, **kwargs):
+            self.calls += 1
+            return func(*args, **kwargs)
+
+        return wrapper
+
+
+def uncached_get_database(Settings):
+    """ `get_database()` as it was before the memoization """
+    credentials = Settings.profile
+    id, name = credentials["id"], credentials["name"]
+    address = validate_database_address(Settings)
+
+    if not os.path.isfile(address):
+        create_database(address, Settings.logger, name)
+
+    id = get_profile(name, address, Settings.logger, Settings) if id is None else id
+
+    return address, id
+
+
+def run(name, func, calls):
+    with PathCallCounter() as counter:
+        start = time.time()
+        for _ in range(calls):
+            func(Settings)
+        elapsed = time.time() - start
+
+    print(
+        "{:<10} {:>7} calls in {:>7.3f}s ({:>6.2f}us/call), "
+        "{:>7} path checks".format(
+            name, calls, elapsed, elapsed / calls * 1e6, counter.calls
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=100000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    try:
+        Settings.DATABASE_LOCATION = os.path.join(workdir, "db", "facebookpy.db")
+        Settings.logger = logging.getLogger(__name__)
+        Settings.profile = {"id": None, "name": "benchmark"}
+        database_engine.resolved_databases.clear()
+        get_database(Settings, make=True)
+
+        run("uncached", uncached_get_database, args.calls)
+        run("memoized", get_database, args.calls)
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
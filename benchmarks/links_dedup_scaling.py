@@ -0,0 +1,69 @@
+"""
+Show how collecting the post links of a profile scales with the number of
+links: re-reading every anchor and re-sorting after each scroll, as
+`get_links_for_username()` did, against the incremental `LinkCollector`
+
+The page is simulated by a list growing by `--per-scroll` links per scroll,
+so only the Python side of the collection is measured. The re-sorting
+grows about cubically, so it is skipped above `--resorting-limit` links.
+
+Usage:
+    python benchmarks/links_dedup_scaling.py --sizes 1000 5000 10000
+"""
+import argparse
+import time
+
+from facebookpy.browser_util import LinkCollector
+
+
+def page_links(size):
+    return ["https://www.facebook.com/photo/{}/".format(i) for i in range(size)]
+
+
+def collect_resorting(page, per_scroll):
+    """ The whole list of anchors is read and de-duplicated every scroll """
+    links = []
+    loaded = 0
+    while len(links) < len(page):
+        loaded += per_scroll
+        links = links + page[:loaded]
+        links = sorted(set(links), key=links.index)
+    return links
+
+
+def collect_incremental(page, per_scroll):
+    """ Only the anchors loaded by the scroll are read """
+    collector = LinkCollector()
+    loaded = 0
+    while len(collector) < len(page):
+        collector.add(page[loaded : loaded + per_scroll])
+        loaded += per_scroll
+    return collector.links
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 10000])
+    parser.add_argument("--per-scroll", type=int, default=12)
+    parser.add_argument("--resorting-limit", type=int, default=5000)
+    args = parser.parse_args()
+
+    print("{:>7} {:>12} {:>12}".format("links", "resorting", "incremental"))
+    for size in args.sizes:
+        page = page_links(size)
+        timings = []
+        for func in [collect_resorting, collect_incremental]:
+            if func is collect_resorting and size > args.resorting_limit:
+                timings.append("skipped")
+                continue
+
+            start = time.time()
+            links = func(page, args.per_scroll)
+            timings.append("{:.3f}s".format(time.time() - start))
+            assert links == page
+
+        print("{:>7} {:>12} {:>12}".format(size, *timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Measure the seconds the existence checks of the features spend on the
+implicit wait, looking elements up as they used to against `probe()`
+
+Runs the lookups of each feature against the local HTML fixtures in a
+headless browser; elements which are legitimately missing used to cost a
+whole `page_delay` each.
+
+Usage:
+    python benchmarks/probe_implicit_wait.py --page-delay 25 --browser firefox
+"""
+import argparse
+import os
+import time
+
+from selenium import webdriver
+
+from facebookpy.browser_util import probe
+from facebookpy.browser_util import remember_implicit_wait
+from facebookpy.browser_util import PROBE_TIMEOUT
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+LIKE_XPATH = "//section/span/button/span[@aria-label='Like']"
+UNLIKE_XPATH = "//section/span/button/span[@aria-label='Unlike']"
+INVITE_XPATH = "//*[contains(text(), 'Invite ')]"
+UNFOLLOW_XPATH = "//button[text()='Unfollow']"
+
+# fixture and lookups of each feature, as (xpath, probe timeout)
+FEATURES = [
+    (
+        "like_image (already liked)",
+        "liked_post.html",
+        [(LIKE_XPATH, PROBE_TIMEOUT), (UNLIKE_XPATH, 0)],
+    ),
+    (
+        "try_invite_with (no invite option)",
+        "page_actions_menu.html",
+        [(INVITE_XPATH, PROBE_TIMEOUT)] * 4,
+    ),
+    (
+        "withdraw_outgoing_friends_requests",
+        "outgoing_request_menu.html",
+        [
+            ("//*[contains(text(), 'Cancel request')]", PROBE_TIMEOUT),
+            ("//*[contains(text(), 'Cancel Request')]", PROBE_TIMEOUT),
+        ],
+    ),
+    ("confirm_unfriend (no dialog)", "liked_post.html", [(UNFOLLOW_XPATH, 0)] * 3),
+]
+
+
+def start_browser(name, page_delay):
+    if name == "firefox":
+        options = webdriver.FirefoxOptions()
+        options.add_argument("-headless")
+        browser = webdriver.Firefox(options=options)
+    else:
+        options = webdriver.ChromeOptions()
+        options.add_argument("--headless")
+        browser = webdriver.Chrome(options=options)
+
+    browser.implicitly_wait(page_delay)
+    remember_implicit_wait(browser, page_delay)
+    return browser
+
+
+def lookup_implicitly(browser, lookups):
+    for xpath, _ in lookups:
+        browser.find_elements_by_xpath(xpath)
+
+
+def lookup_probing(browser, lookups):
+    for xpath, timeout in lookups:
+        probe(browser, xpath, timeout=timeout)
+
+
+def timed(func, *args):
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--page-delay", type=int, default=25)
+    parser.add_argument("--browser", choices=["firefox", "chrome"], default="firefox")
+    args = parser.parse_args()
+
+    browser = start_browser(args.browser, args.page_delay)
+    try:
+        print(
+            "{:<38} {:>9} {:>9} {:>9}".format("feature", "implicit", "probe", "saved")
+        )
+        for name, fixture, lookups in FEATURES:
+            browser.get("file://" + os.path.join(FIXTURES, fixture))
+            implicit = timed(lookup_implicitly, browser, lookups)
+            probing = timed(lookup_probing, browser, lookups)
+            print(
+                "{:<38} {:>8.2f}s {:>8.2f}s {:>8.2f}s".format(
+                    name, implicit, probing, implicit - probing
+                )
+            )
+    finally:
+        browser.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+"""
+Local stand-in for facebook.com serving anonymized snapshots of the pages
+the features scrape, so that a session can run without network access
+
+The pages keep the markup the selectors of facebookpy.py, like_util.py,
+unfollow_util.py, unfriend_util.py and commenters_util.py look for. Their
+lists have `--rows` entries and load `--page-size` more on every scroll to
+the bottom, like the endless lists of the site. The links in the pages
+point at https://www.facebook.com, a session started with
+`FacebookPy(replay_address=...)` has its navigation rewritten to here.
+
+Served pages:
+    /<user>/friends_recent, /<user>/friends    friends list
+    /friends/requests/                         friend requests to confirm
+    /friends/requests/?outgoing=1              outgoing friend requests
+    /groups/<id>/members_with_things_in_common/
+    /pages/<id>/likers/                        page likers
+    /search/pages/?q=<term>                    page search results
+    /<user>/                                   profile
+    /<user>/followers                          followers list
+    /<user>/about                              about page with a birthday
+    /<user>/posts/<id>                         post with its likers dialog
+
+Usage:
+    python benchmarks/replay_server.py --rows 1000 --port 8000
+"""
+import argparse
+import re
+import threading
+from string import Template
+
+try:
+    from http.server import BaseHTTPRequestHandler
+    from http.server import HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs
+    from urllib.parse import urlparse
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs
+    from urlparse import urlparse
+
+SITE = "https://www.facebook.com"
+
+LAYOUT = Template(
+    """<!DOCTYPE html>
+<html id="facebook">
+<head>
+<meta charset="utf-8">
+<title>$title</title>
+<style>
+    li, .row { min-height: 64px; }
+    .hidden_elem, .menu { display: none; }
+    .menu.open { display: block; }
+    div[role=dialog] { height: 400px; overflow-y: auto; }
+    div[role=dialog] a { display: block; height: 40px; }
+</style>
+</head>
+<body>
+$body
+<script>
+    // reveal the next chunk of a list when it is scrolled to the bottom
+    Array.prototype.forEach.call(document.querySelectorAll(".endless"), function (list) {
+        var own = list.hasAttribute("data-own-scroll");
+        (own ? list : window).addEventListener("scroll", function () {
+            var bottom = own
+                ? list.scrollTop + list.clientHeight >= list.scrollHeight - 10
+                : window.scrollY + window.innerHeight >= document.body.scrollHeight - 10;
+            var more = list.querySelector("template");
+            if (bottom && more) {
+                list.insertBefore(document.importNode(more.content, true), more);
+                list.removeChild(more);
+            }
+        });
+    });
+    // menus open on click of their button
+    Array.prototype.forEach.call(document.querySelectorAll("[data-menu]"), function (button) {
+        button.addEventListener("click", function () {
+            document.getElementById(button.getAttribute("data-menu")).className = "menu open";
+        });
+    });
+    // buttons which change their text once clicked
+    Array.prototype.forEach.call(document.querySelectorAll("[data-clicked]"), function (button) {
+        button.addEventListener("click", function () {
+            button.textContent = button.getAttribute("data-clicked");
+        });
+    });
+</script>
+</body>
+</html>
+"""
+)
+
+FRIEND_ROW = Template(
+    """<li><div><div><div class="uiProfileBlockContent"><div>
+<div>$mutual mutual friends</div>
+<div><a href="$href" data-hovercard="/ajax/hovercard/user.php?id=$id">$name</a></div>
+</div></div></div></div></li>"""
+)
+
+FOLLOWER_ROW = Template(
+    """<li><div><div><div>.</div><div><div><div>.</div><div>
+<div><a href="$href">$name</a></div>
+</div></div></div></div></div></li>"""
+)
+
+REQUEST_ROW = Template(
+    """<div class="ruResponseSectionContainer row"><div><div>$name</div><div><div><div>
+<button type="button" data-clicked="Request confirmed">Confirm</button>
+</div></div></div></div></div>"""
+)
+
+OUTGOING_ROW = Template(
+    """<div class="requestInfoContainer row"><a href="$href">$name</a>
+<button class="FriendRequestOutgoing outgoingButton" data-menu="outgoing_menu">Friend Request Sent</button>
+</div>"""
+)
+
+MEMBER_ROW = Template(
+    """<div id="things_in_common_$id" class="row"><a href="$href">$name</a>
+<div class="FriendButton">
+<button class="FriendRequestAdd addButton$hidden" data-clicked="Friend Request Sent">$button</button>
+</div></div>"""
+)
+
+LIKER_ROW = Template(
+    """<div class="row"><a href="$href">$name</a>
+<div class="FriendButton">
+<button class="FriendRequestAdd addButton$hidden" data-clicked="Friend Request Sent">$button</button>
+</div></div>"""
+)
+
+PAGE_RESULT_ROW = Template(
+    """<div class="row"><div class="_4bl9"><div><div>.</div><div class="_glm"><div>
+<a href="$site/pages/$id/likers/">Page $id</a>
+</div></div></div></div></div>"""
+)
+
+POST_ROW = Template(
+    """<div><div><div><div><div><div><div><div><div><div class="row">
+<span><span><a href="$site/$user/posts/$id">Post</a></span></span>
+</div></div></div></div></div></div></div></div></div></div>"""
+)
+
+INVITE_ROW = Template(
+    """<li><div><table><tbody><tr><td>.</td>
+<td><div class="ellipsis"><a href="#"><span>$page</span></a></div><div class="ellipsis">Page</div></td>
+<td><button data-clicked="Invited">Invite</button></td>
+</tr></tbody></table></div></li>"""
+)
+
+# the pages of the account, a friend can be invited to like
+INVITE_PAGES = ["Replay Page", "Other Page"]
+
+DIALOG_ROW = Template("""<a href="$href">$name</a>""")
+
+
+def person(index):
+    """ The anonymized person of a row; every tenth one has no username """
+    if index % 10 == 0:
+        href = "{}/profile.php?id={}".format(SITE, 100000 + index)
+    else:
+        href = "{}/person{}?fref=pb".format(SITE, index)
+
+    return {
+        "id": 100000 + index,
+        "href": href,
+        "name": "Person {}".format(index),
+        "mutual": index % 50,
+        # some requests are sent already, some rows are hidden
+        "button": "Friend Request Sent" if index % 5 == 0 else "Add Friend",
+        "hidden": " hidden_elem" if index % 7 == 0 else "",
+        "site": SITE,
+    }
+
+
+def endless_list(tag, attributes, row, rows, page_size, **fields):
+    """ Render the first `page_size` rows and keep the others in templates
+    revealed one by one on scroll """
+    chunks = []
+    for start in range(0, max(rows, 1), page_size):
+        chunk = "".join(
+            row.substitute(dict(person(i), **fields))
+            for i in range(start, min(start + page_size, rows))
+        )
+        chunks.append(chunk if start == 0 else "<template>{}</template>".format(chunk))
+
+    return '<{0} class="endless" {1}>{2}</{0}>'.format(tag, attributes, "".join(chunks))
+
+
+class ReplaySite:
+    """ Build the pages of the stand-in site """
+
+    def __init__(self, rows=100, page_size=20):
+        self.rows = rows
+        self.page_size = page_size
+        self.routes = [
+            (r"^/friends/requests/?$", self.friend_requests),
+            (r"^/groups/[^/]+/members_with_things_in_common/?$", self.group_members),
+            (r"^/pages/[^/]+/likers/?$", self.page_likers),
+            (r"^/search/pages/?$", self.page_search),
+            (r"^/([^/]+)/friends(_recent)?/?$", self.friends),
+            (r"^/([^/]+)/followers/?$", self.followers),
+            (r"^/([^/]+)/about/?$", self.about),
+            (r"^/([^/]+)/posts/([^/]+)/?$", self.post),
+            (r"^/([^/]+)/?$", self.profile),
+        ]
+
+    def list_of(self, tag, attributes, row, **fields):
+        return endless_list(tag, attributes, row, self.rows, self.page_size, **fields)
+
+    def render(self, path, query):
+        """ Return the HTML of the page at `path` or None if unknown """
+        for pattern, page in self.routes:
+            match = re.match(pattern, path)
+            if match:
+                title, body = page(query, *match.groups())
+                return LAYOUT.substitute(title=title, body=body)
+
+    def friends(self, query, user, recent=None):
+        return "Friends", "<div>{}</div>".format(self.list_of("ul", "", FRIEND_ROW))
+
+    def followers(self, query, user):
+        return (
+            "Followers",
+            "<div><div>Followers</div><div>{}</div></div>".format(
+                self.list_of("ul", "", FOLLOWER_ROW)
+            ),
+        )
+
+    def friend_requests(self, query):
+        if query.get("outgoing"):
+            return (
+                "Sent Requests",
+                self.list_of("div", "", OUTGOING_ROW)
+                + '<ul id="outgoing_menu" class="menu"><li>'
+                '<a href="#" onclick="this.parentNode.parentNode.className='
+                "'menu'; return false;\">Cancel Request</a></li></ul>",
+            )
+
+        return "Friend Requests", self.list_of("div", "", REQUEST_ROW)
+
+    def group_members(self, query):
+        return "Members", self.list_of("div", "", MEMBER_ROW)
+
+    def page_likers(self, query):
+        return (
+            "People who like this",
+            self.list_of("div", 'data-testid="browse_results"', LIKER_ROW),
+        )
+
+    def page_search(self, query):
+        return "Pages", "<div>{}</div>".format(self.list_of("div", "", PAGE_RESULT_ROW))
+
+    def profile(self, query, user):
+        return (
+            "Profile",
+            """<div id="fbTimelineHeadline"><div><div><div><div>
+<button type="button" data-clicked="Friend Request Sent">Add Friend</button>
+</div></div></div></div></div>
+<span id="fb-timeline-cover-name"><a href="{site}/{user}">Person {user}</a></span>
+<div><div><a role="button" href="#" onclick="this.textContent='Following';
+this.parentNode.appendChild(document.createElement('button')).textContent='Following';
+return false;">Follow</a></div></div>
+<a name="Followers" href="{site}/{user}/followers"><span>Followers</span><span>{rows}</span></a>
+<a name="Following" href="{site}/{user}/following"><span>Following</span><span>{rows}</span></a>
+<div id="pagelet_timeline_profile_actions">
+<div class="FriendButton"><a href="#" data-menu="profile_menu"><span><span>Friends</span></span></a></div>
+<div><div><button data-menu="profile_menu"><i>...</i></button></div></div>
+</div>
+<ul id="profile_menu" class="menu">
+<li><a href="#">Unfriend</a></li>
+<li><a href="#" onclick="document.getElementById('invite').style.display='block';
+return false;">Invite Person {user} to like your Pages</a></li>
+</ul>
+<div id="invite" style="display: none"><div><div><div><div><div><div><div>
+<div class="uiScrollableArea"><div class="uiScrollableAreaWrap"><div><div><ul>
+{pages}</ul></div></div></div></div>
+</div></div></div></div></div></div></div></div>
+<article>{posts}</article>""".format(
+                site=SITE,
+                user=user,
+                rows=self.rows,
+                pages="".join(
+                    INVITE_ROW.substitute(page=page) for page in INVITE_PAGES
+                ),
+                posts=self.list_of("div", "", POST_ROW, user=user),
+            ),
+        )
+
+    def about(self, query, user):
+        return (
+            "About",
+            "<div><ul><li><div><div><span><div>Birthday</div><div>May 4, 1990</div>"
+            "</span></div></div></li></ul></div>",
+        )
+
+    def post(self, query, user, post):
+        # the likers dialog is the second child of the tenth <div> of <body>
+        filler = "<div></div>" * 8
+        return (
+            "Post",
+            """<div><form><div><div><div><div><div><span><span>
+<a role="button" href="#" onclick="document.getElementById('likers').style.display='block';
+return false;">{rows} likes</a>
+</span></span></div></div></div></div></div></form></div>{filler}
+<div><div></div><div id="likers" role="dialog" style="display: none">{likers}</div></div>
+""".format(
+                rows=self.rows,
+                filler=filler,
+                likers=self.list_of("div", "data-own-scroll", DIALOG_ROW),
+            ),
+        )
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def make_handler(site):
+    class ReplayHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            page = site.render(url.path, query)
+
+            if page is None:
+                self.send_error(404)
+                return
+
+            content = page.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    return ReplayHandler
+
+
+class ReplayServer:
+    """ Serve a `ReplaySite` from a background thread """
+
+    def __init__(self, rows=100, page_size=20, host="127.0.0.1", port=0):
+        self.site = ReplaySite(rows, page_size)
+        self.server = ThreadingHTTPServer((host, port), make_handler(self.site))
+        self.thread = None
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    server = ReplayServer(args.rows, args.page_size, port=args.port)
+    print("Serving the replay site at {}".format(server.address))
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
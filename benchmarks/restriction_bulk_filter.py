@@ -0,0 +1,102 @@
+"""
+Benchmark filtering harvested candidates against the follow restriction
+history one by one against the bulk look-up
+
+Usage:
+    python benchmarks/restriction_bulk_filter.py --rows 100000 --candidates 10000
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from facebookpy.database_engine import create_database
+from facebookpy.database_engine import get_connection
+from facebookpy.database_engine import close_connections
+from facebookpy.database_engine import select_restriction_times
+from facebookpy.database_engine import SELECT_FROM_FOLLOW_RESTRICTION
+from facebookpy.restriction_cache import RestrictionCache
+
+
+def populate(address, rows):
+    conn = sqlite3.connect(address)
+    with conn:
+        conn.execute("INSERT INTO profiles (name) VALUES (?)", ("benchmark",))
+        conn.executemany(
+            "INSERT INTO followRestriction (profile_id, username, times) "
+            "VALUES (1, ?, 1)",
+            (("user{}".format(i),) for i in range(rows)),
+        )
+    conn.close()
+
+
+def filter_per_item(address, candidates):
+    """ One indexed look-up per candidate """
+    conn = get_connection(address)
+    eligible = []
+    with conn:
+        cur = conn.cursor()
+        for username in candidates:
+            cur.execute(SELECT_FROM_FOLLOW_RESTRICTION, (1, username))
+            if cur.fetchone() is None:
+                eligible.append(username)
+    return eligible
+
+
+def filter_bulk(address, candidates):
+    """ `IN` look-ups over chunks of the candidates """
+    found = select_restriction_times(
+        get_connection(address), "followRestriction", 1, candidates
+    )
+    return [username for username in candidates if username not in found]
+
+
+def filter_cold_cache(address, candidates):
+    """ What `filter_follow_restricted()` does when the history is too big
+    to be kept in memory """
+    cache = RestrictionCache(address, 1, max_entries=1000).preload()
+    return cache.eligible("followRestriction", candidates, 1)
+
+
+def run(name, func, address, candidates):
+    start = time.time()
+    eligible = func(address, candidates)
+    elapsed = time.time() - start
+    print(
+        "{:<10} {:>6} candidates -> {:>6} eligible in {:>7.3f}s".format(
+            name, len(candidates), len(eligible), elapsed
+        )
+    )
+    close_connections()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--candidates", type=int, default=10000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    address = os.path.join(workdir, "facebookpy.db")
+    try:
+        create_database(address, logging.getLogger(__name__), "benchmark")
+        populate(address, args.rows)
+        # about half of the candidates were followed before
+        candidates = [
+            "user{}".format(random.randint(0, args.rows * 2))
+            for _ in range(args.candidates)
+        ]
+
+        run("per-item", filter_per_item, address, candidates)
+        run("bulk", filter_bulk, address, candidates)
+        run("cold-cache", filter_cold_cache, address, candidates)
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
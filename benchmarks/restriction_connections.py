@@ -0,0 +1,98 @@
+"""
+Benchmark restriction lookups with a connection per call against the
+session-wide connection of `database_engine` and the restriction cache
+
+Usage:
+    python benchmarks/restriction_connections.py --rows 5000 --lookups 10000
+"""
+import argparse
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from facebookpy.database_engine import create_database
+from facebookpy.database_engine import get_connection
+from facebookpy.database_engine import close_connections
+from facebookpy.database_engine import SELECT_FROM_FOLLOW_RESTRICTION
+from facebookpy.restriction_cache import RestrictionCache
+
+
+def populate(address, rows):
+    conn = sqlite3.connect(address)
+    with conn:
+        conn.execute("INSERT INTO profiles (name) VALUES (?)", ("benchmark",))
+        conn.executemany(
+            "INSERT INTO followRestriction (profile_id, username, times) "
+            "VALUES (1, ?, 1)",
+            (("user{}".format(i),) for i in range(rows)),
+        )
+    conn.close()
+
+
+def lookup_per_call(address, usernames):
+    """ What the restriction helpers did before: connect, select, close """
+    for username in usernames:
+        conn = sqlite3.connect(address)
+        with conn:
+            conn.row_factory = sqlite3.Row
+            cur = conn.cursor()
+            cur.execute(SELECT_FROM_FOLLOW_RESTRICTION, (1, username))
+            cur.fetchone()
+        conn.close()
+
+
+def lookup_shared(address, usernames):
+    """ What the restriction helpers do now: reuse the session connection """
+    for username in usernames:
+        conn = get_connection(address)
+        with conn:
+            cur = conn.cursor()
+            cur.execute(SELECT_FROM_FOLLOW_RESTRICTION, (1, username))
+            cur.fetchone()
+    close_connections()
+
+
+def lookup_cached(address, usernames):
+    """ Restriction reads served by the preloaded cache of the profile """
+    cache = RestrictionCache(address, 1).preload()
+    for username in usernames:
+        cache.times("followRestriction", (username,))
+    close_connections()
+
+
+def run(name, func, address, usernames):
+    start = time.time()
+    func(address, usernames)
+    elapsed = time.time() - start
+    print(
+        "{:<10} {:>8} lookups in {:>7.3f}s  ->  {:>10.0f} ops/sec".format(
+            name, len(usernames), elapsed, len(usernames) / elapsed
+        )
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--lookups", type=int, default=10000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    address = os.path.join(workdir, "facebookpy.db")
+    try:
+        create_database(address, logging.getLogger(__name__), "benchmark")
+        populate(address, args.rows)
+        usernames = ["user{}".format(i % args.rows) for i in range(args.lookups)]
+
+        run("per-call", lookup_per_call, address, usernames)
+        run("shared", lookup_shared, address, usernames)
+        run("cached", lookup_cached, address, usernames)
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
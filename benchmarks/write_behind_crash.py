@@ -0,0 +1,108 @@
+"""
+Show how many queued restriction writes are lost when a session is killed
+
+A child process keeps queueing follow restriction writes through the
+write-behind queue and reports each one on stdout; the parent kills it
+with SIGKILL after a while and compares the reported writes against the
+rows which made it into the DB.
+
+Usage:
+    python benchmarks/write_behind_crash.py --flush-interval 500 --batch-size 100
+"""
+import argparse
+import logging
+import os
+import shutil
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from facebookpy.database_engine import create_database
+from facebookpy.database_engine import UPSERT_FOLLOW_RESTRICTION
+from facebookpy.write_behind import start_write_behind
+from facebookpy.write_behind import execute_write
+
+
+def child(address, flush_interval, batch_size, durability, rate):
+    start_write_behind(address, flush_interval, batch_size, durability)
+    written = 0
+    while True:
+        execute_write(address, UPSERT_FOLLOW_RESTRICTION, (1, "user{}".format(written)))
+        written += 1
+        sys.stdout.write("{}\n".format(written))
+        sys.stdout.flush()
+        time.sleep(1.0 / rate)
+
+
+def parent(args):
+    workdir = tempfile.mkdtemp()
+    address = os.path.join(workdir, "facebookpy.db")
+    try:
+        create_database(address, logging.getLogger(__name__), "benchmark")
+
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                __file__,
+                "--child",
+                address,
+                "--flush-interval",
+                str(args.flush_interval),
+                "--batch-size",
+                str(args.batch_size),
+                "--durability",
+                args.durability,
+                "--rate",
+                str(args.rate),
+            ],
+            stdout=subprocess.PIPE,
+        )
+        time.sleep(args.run_for)
+        os.kill(process.pid, signal.SIGKILL)
+        output = process.communicate()[0].split()
+        queued = int(output[-1]) if output else 0
+
+        conn = sqlite3.connect(address)
+        stored = conn.execute("SELECT COUNT(*) FROM followRestriction").fetchone()[0]
+        conn.close()
+
+        print(
+            "flush every {}ms or {} rows, durability '{}', {} writes/sec".format(
+                args.flush_interval, args.batch_size, args.durability, args.rate
+            )
+        )
+        print(
+            "queued {}, stored {}, lost on kill {} (at most ~{} expected)".format(
+                queued,
+                stored,
+                queued - stored,
+                min(args.batch_size, int(args.rate * args.flush_interval / 1000.0) + 1),
+            )
+        )
+    finally:
+        shutil.rmtree(workdir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--child", metavar="ADDRESS")
+    parser.add_argument("--flush-interval", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--durability", default="normal")
+    parser.add_argument("--rate", type=float, default=200, help="writes per second")
+    parser.add_argument("--run-for", type=float, default=3, help="seconds")
+    args = parser.parse_args()
+
+    if args.child:
+        child(
+            args.child, args.flush_interval, args.batch_size, args.durability, args.rate
+        )
+    else:
+        parent(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,468 @@
+""" Module with the helpers which keep the browser round trips cheap """
+from contextlib import contextmanager
+from itertools import count
+import time
+
+try:
+    from urllib.parse import urlparse
+except ImportError:  # Python 2
+    from urlparse import urlparse
+
+from socialcommons.util import web_address_navigator
+from selenium.webdriver.common.by import By
+
+# implicit wait the session browser gets from `page_delay`, used when the
+# browser wasn't set up by `remember_implicit_wait()`
+DEFAULT_IMPLICIT_WAIT = 25
+
+# the short wait of the probes looking for elements which may still be
+# rendering, e.g. a menu right after the click which opens it
+PROBE_TIMEOUT = 3
+
+LOCATORS = {
+    "xpath": By.XPATH,
+    "css": By.CSS_SELECTOR,
+    "tag": By.TAG_NAME,
+    "link": By.LINK_TEXT,
+}
+
+
+def remember_implicit_wait(browser, seconds):
+    """ Keep the implicit wait of the browser to restore it after probing;
+    WebDriver has no way to read it back """
+    browser.implicit_wait = seconds
+
+
+@contextmanager
+def implicit_wait(browser, seconds):
+    """ Use another implicit wait for the lookups inside the block """
+    browser.implicitly_wait(seconds)
+    try:
+        yield browser
+
+    finally:
+        browser.implicitly_wait(
+            getattr(browser, "implicit_wait", DEFAULT_IMPLICIT_WAIT)
+        )
+
+
+def probe(browser, locator, by="xpath", timeout=0, root=None):
+    """
+    Return the elements matching `locator`, waiting at most `timeout`
+    seconds for them instead of the whole `page_delay`.
+
+    Use it wherever finding nothing is a legit answer; `root` narrows the
+    lookup down to the children of an element.
+    """
+    with implicit_wait(browser, timeout):
+        return (root or browser).find_elements(LOCATORS[by], locator)
+
+
+def probe_one(browser, locator, by="xpath", timeout=0, root=None):
+    """ Return the first element matching `locator` or None, see `probe()` """
+    elements = probe(browser, locator, by, timeout, root)
+    return elements[0] if elements else None
+
+
+# one round trip for what used to be a `get_attribute()` call per anchor
+EXTRACT_LINKS_SCRIPT = """
+    var root = arguments[1] || document;
+    var anchors = root.querySelectorAll(arguments[0]);
+    var links = [];
+    for (var i = 0; i < anchors.length; i++) {
+        var anchor = anchors[i];
+        var url = new URL(anchor.href, document.baseURI);
+        var path = url.pathname.split("/")[1] || null;
+        var hovercard = anchor.getAttribute("data-hovercard") || "";
+        var id = /[?&]id=(\\d+)/.exec(hovercard) || /[?&]id=(\\d+)/.exec(url.search);
+        links.push({
+            href: anchor.href,
+            name: (anchor.textContent || "").trim(),
+            username: path === "profile.php" ? null : path,
+            userid: id ? id[1] : null
+        });
+    }
+    return links;
+"""
+
+
+def extract_links(browser, css_selector, root=None):
+    """
+    Return the anchors matching `css_selector` with a single script run, as
+    dicts with the `href`, the display `name`, the `username` (None for
+    the unnamed "profile.php?id=" profiles) and the numeric `userid`, if
+    the anchor tells.
+    """
+    return browser.execute_script(EXTRACT_LINKS_SCRIPT, css_selector, root) or []
+
+
+# read the state of every "Add Friend" row of the group members and page
+# likers lists at once, instead of ~5 round trips per row
+PARSE_FRIEND_ROWS_SCRIPT = """
+    var rows = arguments[0];
+    var records = [];
+    for (var i = 0; i < rows.length; i++) {
+        var button = rows[i].querySelector(
+            "div.FriendButton > button.FriendRequestAdd.addButton"
+        );
+        var anchor = rows[i].querySelector("a");
+        var path = null;
+        if (anchor) {
+            path = new URL(anchor.href, document.baseURI).pathname.split("/")[1];
+        }
+        records.push({
+            button: button ? button.textContent.trim() : null,
+            hidden: button ? button.classList.contains("hidden_elem") : false,
+            href: anchor ? anchor.href : null,
+            username: path && path !== "profile.php" ? path : null
+        });
+    }
+    return records;
+"""
+
+
+def parse_friend_rows(browser, rows):
+    """
+    Return a record per row of a people list with a single script run: the
+    text of its "Add Friend" `button` (None without one), whether the
+    button is `hidden`, the profile `href` (None without a link) and the
+    `username` (None for the unnamed "profile.php?id=" profiles).
+    """
+    if not rows:
+        return []
+
+    return browser.execute_script(PARSE_FRIEND_ROWS_SCRIPT, rows)
+
+
+# hand out only the anchors which weren't seen in the previous runs, marking
+# them on the page, so that each scroll reads just what it loaded
+EXTRACT_NEW_LINKS_SCRIPT = """
+    var root = arguments[0] || document;
+    var texts = arguments[1];
+    var anchors = root.querySelectorAll("a:not([data-facebookpy-seen])");
+    var links = [];
+    for (var i = 0; i < anchors.length; i++) {
+        var anchor = anchors[i];
+        anchor.setAttribute("data-facebookpy-seen", "");
+        if (!texts || texts.indexOf(anchor.innerText.trim()) !== -1) {
+            links.push(anchor.href);
+        }
+    }
+    return links;
+"""
+
+
+def extract_new_links(browser, root=None, texts=None):
+    """ Return the hrefs of the anchors added since the last call, only
+    those whose text is one of `texts` if given """
+    return browser.execute_script(EXTRACT_NEW_LINKS_SCRIPT, root, texts) or []
+
+
+# read the users of a dialog from the `start`th anchor on, so that each
+# scroll only reads what it loaded; a shrunk list (e.g. re-rendered) is read
+# again from the top
+EXTRACT_DIALOG_USERS_SCRIPT = """
+    var anchors = arguments[0].getElementsByTagName("a");
+    var start = arguments[1] <= anchors.length ? arguments[1] : 0;
+    var users = [];
+    for (var i = start; i < anchors.length; i++) {
+        var text = anchors[i].innerText.trim();
+        if (text) {
+            users.push(text);
+        }
+    }
+    return [anchors.length, users];
+"""
+
+
+def extract_dialog_users(browser, dialog, start=0):
+    """ Return the position to go on from next time and the users of the
+    dialog's anchors from the `start`th one on """
+    position, users = browser.execute_script(
+        EXTRACT_DIALOG_USERS_SCRIPT, dialog, start
+    )
+    return position, users
+
+
+class LinkCollector:
+    """ Collect links in the order they show up, each only once """
+
+    def __init__(self):
+        self.links = []
+        self.seen = set()
+
+    def __len__(self):
+        return len(self.links)
+
+    def add(self, links):
+        """ Keep the links which weren't collected yet and return how many """
+        added = 0
+        for link in links:
+            if link not in self.seen:
+                self.seen.add(link)
+                self.links.append(link)
+                added += 1
+
+        return added
+
+
+# scroll to the bottom (if told) and measure how much of the list loaded:
+# the count of the target nodes or else the height of the page
+SCROLL_AND_MEASURE_SCRIPT = """
+    if (arguments[1]) {
+        window.scrollTo(0, document.body.scrollHeight);
+    }
+    if (arguments[0]) {
+        return document.querySelectorAll(arguments[0]).length;
+    }
+    return document.body.scrollHeight;
+"""
+
+
+def scroll_until_stable(
+    browser,
+    css_selector=None,
+    target_count=None,
+    idle_timeout=6,
+    max_scrolls=20,
+    poll_interval=0.5,
+):
+    """
+    Scroll an endless list down until it stops growing, returning its size.
+
+    The size is the count of the nodes matching `css_selector`, or else the
+    height of the page. Scrolling stops as soon as `target_count` nodes are
+    loaded, when a scroll loads nothing within `idle_timeout` seconds or
+    after `max_scrolls` scrolls.
+    """
+    size = browser.execute_script(SCROLL_AND_MEASURE_SCRIPT, css_selector, False)
+
+    for _ in range(max_scrolls):
+        if css_selector and target_count and size >= target_count:
+            break
+
+        browser.execute_script(SCROLL_AND_MEASURE_SCRIPT, css_selector, True)
+
+        deadline = time.time() + idle_timeout
+        grown = False
+        while not grown and time.time() < deadline:
+            # the browser loads in real time, whatever the clock of the session
+            time.sleep(poll_interval)
+            measured = browser.execute_script(
+                SCROLL_AND_MEASURE_SCRIPT, css_selector, False
+            )
+            grown = measured > size
+            size = max(size, measured)
+
+        if not grown:
+            break
+
+    return size
+
+
+# read the hrefs of the anchors matching the XPath from the `start`th one on,
+# so that each scroll only reads what it loaded; a shrunk list is read again
+# from the top
+EXTRACT_XPATH_HREFS_SCRIPT = """
+    var found = document.evaluate(
+        arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null
+    );
+    var start = arguments[1] <= found.snapshotLength ? arguments[1] : 0;
+    var hrefs = [];
+    for (var i = start; i < found.snapshotLength; i++) {
+        var href = found.snapshotItem(i).href;
+        if (href) {
+            hrefs.push(href);
+        }
+    }
+    return [found.snapshotLength, hrefs];
+"""
+
+
+def extract_xpath_hrefs(browser, xpath, start=0):
+    """ Return the position to go on from next time and the hrefs of the
+    anchors matching `xpath` from the `start`th one on """
+    position, hrefs = browser.execute_script(EXTRACT_XPATH_HREFS_SCRIPT, xpath, start)
+    return position, hrefs
+
+
+def iter_list_hrefs(browser, xpath, idle_timeout=6, max_scrolls=20):
+    """
+    Yield the hrefs of the anchors of an endless list as they load, each once.
+
+    The page is scrolled for more only once the hrefs read so far are used
+    up, so a consumer which stops iterating stops the scrolling too. The
+    list ends when a scroll loads nothing within `idle_timeout` seconds or
+    after `max_scrolls` scrolls.
+    """
+    seen = set()
+    position = 0
+    height = browser.execute_script(SCROLL_AND_MEASURE_SCRIPT, None, False)
+
+    for scrolls in count():
+        # only the anchors loaded by the last scroll are read
+        position, hrefs = extract_xpath_hrefs(browser, xpath, position)
+        for href in hrefs:
+            if href not in seen:
+                seen.add(href)
+                yield href
+
+        if scrolls >= max_scrolls:
+            return
+
+        measured = scroll_until_stable(
+            browser, idle_timeout=idle_timeout, max_scrolls=1
+        )
+        if measured <= height:
+            return
+        height = measured
+
+
+# the address the URLs of the features start with
+SITE_ADDRESS = "https://www.facebook.com"
+
+
+def rewrite_urls(browser, address, site=SITE_ADDRESS):
+    """
+    Send the navigation of the browser to `address` instead of `site`, e.g.
+    to a local replay of the pages, and report the URLs of `address` back
+    as the ones of `site` so the features don't tell the difference.
+
+    Any spelling of the site's URLs is sent there, over http or https and
+    with or without `www.`.
+    """
+    execute = browser.execute
+    address = address.rstrip("/")
+    site_host = canonical_host(urlparse(site).netloc)
+
+    def rewriting_execute(driver_command, params=None):
+        if driver_command == "get" and params:
+            parsed = urlparse(params["url"])
+            if (
+                parsed.scheme in ("http", "https")
+                and canonical_host(parsed.netloc) == site_host
+            ):
+                path = params["url"][len(parsed.scheme) + 3 + len(parsed.netloc) :]
+                params = dict(params, url=address + path)
+
+        response = execute(driver_command, params)
+
+        if driver_command == "getCurrentUrl" and response:
+            url = response.get("value") or ""
+            if url.startswith(address):
+                response["value"] = site + url[len(address) :]
+
+        return response
+
+    browser.execute = rewriting_execute
+    return browser
+
+
+# mark the loaded document once and return the mark it had before, if any; a
+# reload or another page drops the mark
+MARK_PAGE_SCRIPT = """
+    var mark = window.facebookpyPage || null;
+    if (mark === null) {
+        window.facebookpyPage = arguments[0];
+    }
+    return mark;
+"""
+
+page_marks = count(1)
+
+
+def canonical_host(netloc):
+    """ The host of the site whatever the spelling, with or without `www.` """
+    netloc = netloc.lower()
+    if netloc == "facebook.com":
+        netloc = "www.facebook.com"
+
+    return netloc
+
+
+def canonical_url(url):
+    """ The URL of a page whatever the spelling, e.g. with or without `www.`
+    or a trailing slash """
+    parsed = urlparse(url)
+
+    return "{}{}{}".format(
+        canonical_host(parsed.netloc),
+        parsed.path.rstrip("/"),
+        "?" + parsed.query if parsed.query else "",
+    )
+
+
+class PageState:
+    """
+    What the helpers read from the page loaded in the browser, e.g. the
+    follow status or the post links of a profile, for the next helpers on the
+    same page to reuse instead of loading and reading it again.
+
+    The state belongs to one loaded document, told apart by a mark set on its
+    window; it's dropped as soon as another page or a reload is loaded.
+    """
+
+    def __init__(self):
+        self.url = None
+        self.mark = None
+        self.facts = {}
+        self.loads = 0
+        self.reuses = 0
+
+    def reset(self, url, mark):
+        self.url = url
+        self.mark = mark
+        self.facts = {}
+
+    def get(self, name, default=None):
+        return self.facts.get(name, default)
+
+    def remember(self, name, value):
+        self.facts[name] = value
+        return value
+
+    def forget(self, *names):
+        for name in names:
+            self.facts.pop(name, None)
+
+
+def page_state(browser):
+    """ Get the page state of the browser, there's one per session """
+    state = getattr(browser, "page_state", None)
+    if state is None:
+        state = browser.page_state = PageState()
+    return state
+
+
+def visit_page(browser, url, logger, Settings):
+    """
+    Load the page at `url` unless it's loaded already, and return its state.
+
+    A page visited by this function before is recognized by its mark, without
+    asking for the current URL; a page loaded otherwise, e.g. by
+    `validate_userid()`, is recognized by its URL.
+    """
+    state = page_state(browser)
+    target = canonical_url(url)
+    new_mark = str(next(page_marks))
+
+    mark = browser.execute_script(MARK_PAGE_SCRIPT, new_mark)
+    if mark is not None and mark == state.mark:
+        if state.url == target:
+            state.reuses += 1
+            return state
+
+    elif mark is None and canonical_url(browser.current_url) == target:
+        # a page loaded by someone else, it's marked now
+        state.reset(target, new_mark)
+        state.reuses += 1
+        return state
+
+    web_address_navigator(browser, url, logger, Settings)
+    # the navigator keeps the page if it's at the exact same URL already
+    new_mark = str(next(page_marks))
+    mark = browser.execute_script(MARK_PAGE_SCRIPT, new_mark)
+    state.reset(target, mark or new_mark)
+    state.loads += 1
+
+    return state
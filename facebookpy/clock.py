@@ -0,0 +1,63 @@
+"""
+Module with the clock the features pace their actions by
+
+Every pause between actions goes through `sleep()` here. The real clock
+blocks as before; the virtual one only adds the seconds up, so that a
+benchmark runs the features in seconds and still tells how long they would
+have paced.
+"""
+import time
+
+from socialcommons.time_util import sleep as real_sleep
+
+
+class RealClock:
+    """ Sleep for real, with the sleep percentage of socialcommons """
+
+    def __init__(self):
+        self.slept = 0.0
+
+    def sleep(self, seconds, *args, **kwargs):
+        real_sleep(seconds, *args, **kwargs)
+        self.slept += seconds
+
+    def now(self):
+        return time.time()
+
+
+class VirtualClock:
+    """ Advance the time by the seconds slept without blocking """
+
+    def __init__(self, start=None):
+        self.started = time.time() if start is None else start
+        self.slept = 0.0
+
+    def sleep(self, seconds, *args, **kwargs):
+        self.slept += seconds
+
+    def now(self):
+        return self.started + self.slept
+
+
+# the clock of the running session
+clock = RealClock()
+
+
+def get_clock():
+    return clock
+
+
+def set_clock(new_clock):
+    """ Use `new_clock` from now on and return the previous one """
+    global clock
+    previous, clock = clock, new_clock
+    return previous
+
+
+def sleep(seconds, *args, **kwargs):
+    """ Pause between actions on the current clock """
+    clock.sleep(seconds, *args, **kwargs)
+
+
+def now():
+    return clock.now()
@@ -0,0 +1,119 @@
+""" Module which counts and times the WebDriver commands of a session """
+import json
+import math
+import time
+
+from .wait_util import current_feature
+
+# commands sent outside of any timed feature, e.g. while logging in
+NO_FEATURE = "(no feature)"
+
+
+def percentile(latencies, percent):
+    """ Nearest-rank percentile of sorted latencies """
+    if not latencies:
+        return 0.0
+
+    rank = int(math.ceil(percent / 100.0 * len(latencies))) - 1
+    return latencies[min(max(rank, 0), len(latencies) - 1)]
+
+
+class CommandProfiler:
+    """
+    Count and time every WebDriver command sent by the browser, each
+    attributed to the feature being run.
+
+    Every command goes through `browser.execute()`, element ones included,
+    so wrapping that single method covers them all.
+    """
+
+    def __init__(self, browser):
+        self.browser = browser
+        # {feature: {command: [latencies]}}
+        self.latencies = {}
+        # the wrapper of `execute()` installed before, e.g. `rewrite_urls()`
+        self.wrapped = None
+
+    def install(self):
+        execute = self.browser.execute
+        self.wrapped = self.browser.__dict__.get("execute")
+
+        def profiled_execute(driver_command, params=None):
+            start_time = time.time()
+            try:
+                return execute(driver_command, params)
+
+            finally:
+                self.record(driver_command, time.time() - start_time)
+
+        self.browser.execute = profiled_execute
+        return self
+
+    def uninstall(self):
+        """ Put back whatever `execute()` was before, leaving the wrappers
+        installed earlier in place """
+        if self.wrapped is not None:
+            self.browser.execute = self.wrapped
+        else:
+            # drop the instance attribute to get the method of the class back
+            self.browser.__dict__.pop("execute", None)
+
+    def record(self, command, latency):
+        feature = current_feature() or NO_FEATURE
+        self.latencies.setdefault(feature, {}).setdefault(command, []).append(latency)
+
+    def summary(self):
+        """ Return the commands, total latency and percentiles of each
+        feature, and of each of its commands """
+        summary = {}
+        for feature, commands in self.latencies.items():
+            all_latencies = sorted(
+                latency for latencies in commands.values() for latency in latencies
+            )
+            summary[feature] = dict(
+                self.describe(all_latencies),
+                by_command={
+                    command: self.describe(sorted(latencies))
+                    for command, latencies in commands.items()
+                },
+            )
+
+        return summary
+
+    @staticmethod
+    def describe(latencies):
+        return {
+            "commands": len(latencies),
+            "total": sum(latencies),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+        }
+
+    def report(self):
+        """ Return the table of the features, the busiest first """
+        lines = [
+            "{:<40} {:>8} {:>9} {:>8} {:>8} {:>8}".format(
+                "feature", "commands", "total", "p50", "p95", "p99"
+            )
+        ]
+        summary = self.summary()
+        for feature in sorted(summary, key=lambda f: -summary[f]["total"]):
+            stats = summary[feature]
+            lines.append(
+                "{:<40} {:>8} {:>8.2f}s {:>7.0f}ms {:>7.0f}ms {:>7.0f}ms".format(
+                    feature,
+                    stats["commands"],
+                    stats["total"],
+                    stats["p50"] * 1000,
+                    stats["p95"] * 1000,
+                    stats["p99"] * 1000,
+                )
+            )
+
+        return lines
+
+    def dump(self, path):
+        """ Write the summary to a JSON file """
+        with open(path, "w") as profile:
+            json.dump(self.summary(), profile, indent=2, sort_keys=True)
@@ -4,7 +4,7 @@
 import random
 import emoji
 
-from socialcommons.time_util import sleep
+from .clock import sleep
 from socialcommons.util import update_activity
 from socialcommons.util import add_user_to_blacklist
 from socialcommons.util import click_element
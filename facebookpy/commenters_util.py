@@ -3,15 +3,19 @@
 # https://github.com/timgrossmann/facebook-profilecrawl/blob/master/util
 # /extractor.py
 import time
-from time import sleep
+from .clock import sleep
 import random
 from socialcommons.util import click_element
 from socialcommons.util import update_activity
 from socialcommons.util import web_address_navigator
 from socialcommons.util import scroll_bottom
-from socialcommons.util import get_users_from_dialog
 from socialcommons.util import progress_tracker
 from socialcommons.util import close_dialog_box
+from .browser_util import extract_dialog_users
+from .browser_util import iter_list_hrefs
+from .selectors import Selectors
+from .wait_util import wait_for
+from .wait_util import timed_feature
 from .settings import Settings
 
 from selenium.common.exceptions import NoSuchElementException
@@ -21,7 +25,7 @@ def users_liked(browser, post_url, logger, amount=100):
     post_likers = []
     try:
         web_address_navigator(browser, post_url, logger, Settings)
-        post_likers = likers_from_post(browser, logger, amount)
+        post_likers = likers_from_post(browser, logger, Selectors, amount)
         sleep(2)
     except NoSuchElementException:
         logger.info(
@@ -32,100 +36,130 @@ def users_liked(browser, post_url, logger, amount=100):
     return post_likers
 
 
+def iter_users_liked(browser, post_url, logger, amount=100):
+    """ Yield the users who liked the post as its 'Likes' dialog loads them,
+    up to `amount` if given; stop iterating to stop scrolling the dialog """
+    try:
+        web_address_navigator(browser, post_url, logger, Settings)
+        for user in iter_likers_from_post(browser, logger, Selectors, amount):
+            yield user
+
+    except Exception as exc:
+        logger.error("Some problem occured!\n\t{}".format(str(exc).encode("utf-8")))
+
+
+@timed_feature
 def likers_from_post(browser, logger, Selectors, amount=20):
     """ Get the list of users from the 'Likes' dialog of a photo """
+    try:
+        user_list = list(iter_likers_from_post(browser, logger, Selectors, amount))
+
+        random.shuffle(user_list)
 
+        logger.info(
+            "Got {} likers shuffled randomly whom you can follow:\n{}"
+            "\n".format(len(user_list), user_list)
+        )
+        return user_list
+
+    except Exception as exc:
+        logger.error("Some problem occured!\n\t{}".format(str(exc).encode("utf-8")))
+        return []
+
+
+def open_likes_dialog(browser, logger, Selectors):
+    """ Open the 'Likes' dialog of the post loaded and return its body """
     liked_counter_button = '//form/div/div/div/div/div/span/span/a[@role="button"]'
 
-    try:
-        liked_this = browser.find_elements_by_xpath(liked_counter_button)
-        element_to_click = liked_this[0]
+    liked_this = browser.find_elements_by_xpath(liked_counter_button)
+    element_to_click = liked_this[0]
 
-        sleep(1)
-        click_element(browser, Settings, element_to_click)
-        logger.info("opening likes")
-        # update server calls
-        # update_activity(Settings)
+    sleep(1)
+    click_element(browser, Settings, element_to_click)
+    logger.info("opening likes")
+    # update server calls
+    # update_activity(Settings)
 
-        sleep(1)
+    wait_for(browser, "dialog open", Selectors.likes_dialog_body_xpath)
 
-        # get a reference to the 'Likes' dialog box
-        dialog = browser.find_element_by_xpath(Selectors.likes_dialog_body_xpath)
+    # get a reference to the 'Likes' dialog box
+    dialog = browser.find_element_by_xpath(Selectors.likes_dialog_body_xpath)
 
-        # scroll down the page
-        previous_len = -1
-        browser.execute_script(
-            "arguments[0].scrollTop = arguments[0].scrollHeight", dialog
-        )
-        update_activity(Settings)
-        sleep(1)
+    # scroll down the page
+    browser.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight", dialog)
+    update_activity(Settings)
 
-        start_time = time.time()
-        user_list = []
+    return dialog
 
-        while (
-            not user_list
-            or (len(user_list) != previous_len)
-            and (len(user_list) < amount)
-        ):
 
-            previous_len = len(user_list)
-            scroll_bottom(browser, dialog, 2)
+def iter_likers_from_post(browser, logger, Selectors, amount=20):
+    """ Yield the users of the 'Likes' dialog of the post loaded, up to
+    `amount`; the dialog is closed once done or once the iteration stops """
+    dialog = open_likes_dialog(browser, logger, Selectors)
+    try:
+        for user in iter_likers_from_dialog(browser, dialog, logger, amount):
+            yield user
+    finally:
+        close_dialog_box(browser)
 
-            user_list = get_users_from_dialog(user_list, dialog, logger)
 
-            # write & update records at Progress Tracker
-            progress_tracker(len(user_list), amount, start_time, None)
+def iter_likers_from_dialog(browser, dialog, logger, amount=20):
+    """ Yield the users of the 'Likes' dialog as the scrolls load them, each
+    once, until `amount` of them are seen, if given, or the list stops
+    growing """
+    seen = set()
+    yielded = 0
+    position = 0
+    start_time = time.time()
+    if amount is not None and amount <= 0:
+        return
 
-            if previous_len + 10 >= amount:
-                logger.info("Scrolling finished")
-                sleep(1)
-                break
+    while True:
+        scroll_bottom(browser, dialog, 2)
 
-        random.shuffle(user_list)
-        sleep(1)
+        # only the users loaded by this scroll are read
+        position, users = extract_dialog_users(browser, dialog, position)
+        new_users = []
+        for user in users:
+            if user not in seen:
+                seen.add(user)
+                new_users.append(user)
 
-        close_dialog_box(browser)
+        if not new_users:
+            logger.info("Scrolling finished")
+            break
 
-        logger.info(
-            "Got {} likers shuffled randomly whom you can follow:\n{}"
-            "\n".format(len(user_list), user_list)
-        )
-        return user_list
+        # write & update records at Progress Tracker
+        if amount is not None:
+            progress_tracker(len(seen), amount, start_time, None)
 
-    except Exception as exc:
-        logger.Error("Some problem occured!\n\t{}".format(str(exc).encode("utf-8")))
-        return []
+        for user in new_users:
+            yield user
+            yielded += 1
 
+            # done before the dialog is scrolled for more
+            if amount is not None and yielded >= amount:
+                return
 
+
+@timed_feature
 def get_post_urls_from_profile(
     browser, userid, logger, links_to_return_amount=1, randomize=True
 ):
     try:
-        logger.info("Getting likers from user:  {}".format(userid))
-        web_address_navigator(
-            browser, "https://www.facebook.com/" + userid + "/", logger, Settings
-        )
-        sleep(1)
-
-        posts_a_elems = browser.find_elements_by_xpath(
-            "//div/div/div/div/div/div/div/div/div/div/span/span/a"
-        )
-
-        links = []
-        for post_element in posts_a_elems:
-            try:
-                post_url = post_element.get_attribute("href")
-                # TODO: "/posts/" doesnt cover all types
-                # "/videos/", "/photos/" to be implemented later
-                if "/posts/" in post_url:
-                    links.append(post_url)
-            except Exception as es:
-                logger.error(es)
-
         if randomize is True:
+            # pick among all the posts rendered already, without scrolling
+            links = list(
+                iter_post_urls_from_profile(browser, userid, logger, max_scrolls=0)
+            )
             logger.info("shuffling links")
             random.shuffle(links)
+        else:
+            links = list(
+                iter_post_urls_from_profile(
+                    browser, userid, logger, links_to_return_amount
+                )
+            )
 
         logger.info(
             "Got {}, returning {} links: {}".format(
@@ -134,8 +168,31 @@ def get_post_urls_from_profile(
                 links[:links_to_return_amount],
             )
         )
-        sleep(1)
         return links[:links_to_return_amount]
     except Exception as e:
         logger.error("Error: Couldnt get pictures links.".format(e))
         return []
+
+
+def iter_post_urls_from_profile(browser, userid, logger, amount=None, max_scrolls=20):
+    """ Yield the urls of the posts of the user's profile as they load, each
+    once and up to `amount` of them if given; the profile is scrolled for
+    more only when more are asked for """
+    logger.info("Getting likers from user:  {}".format(userid))
+    web_address_navigator(
+        browser, "https://www.facebook.com/" + userid + "/", logger, Settings
+    )
+    posts_xpath = "//div/div/div/div/div/div/div/div/div/div/span/span/a"
+    wait_for(browser, "list rendered", posts_xpath, by="xpath")
+
+    yielded = 0
+    for post_url in iter_list_hrefs(browser, posts_xpath, max_scrolls=max_scrolls):
+        # TODO: "/posts/" doesnt cover all types
+        # "/videos/", "/photos/" to be implemented later
+        if "/posts/" not in post_url:
+            continue
+
+        yield post_url
+        yielded += 1
+        if amount is not None and yielded >= amount:
+            return
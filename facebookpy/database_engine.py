@@ -1,5 +1,9 @@
+from datetime import datetime
+from datetime import timedelta
 import os
 import sqlite3
+import threading
+import time
 
 SELECT_FROM_PROFILE_WHERE_NAME = "SELECT * FROM profiles WHERE name = :name"
 
@@ -52,6 +56,341 @@ SQL_CREATE_ACCOUNTS_PROGRESS_TABLE = """
         CONSTRAINT `fk_accountsProgress_profiles1`
         FOREIGN KEY(`profile_id`) REFERENCES `profiles`(`id`));"""
 
+SQL_CREATE_FRIEND_RESTRICTION_INDEX = """
+    CREATE UNIQUE INDEX IF NOT EXISTS `friendRestriction_profile_username`
+    ON `friendRestriction` (`profile_id`, `username`);"""
+
+SQL_CREATE_FOLLOW_RESTRICTION_INDEX = """
+    CREATE UNIQUE INDEX IF NOT EXISTS `followRestriction_profile_username`
+    ON `followRestriction` (`profile_id`, `username`);"""
+
+SQL_CREATE_INVITE_RESTRICTION_INDEX = """
+    CREATE UNIQUE INDEX IF NOT EXISTS `inviteRestriction_profile_page_username`
+    ON `inviteRestriction` (`profile_id`, `pagename`, `username`);"""
+
+SQL_CREATE_EXPORT_REVISION_TABLE = """
+    CREATE TABLE IF NOT EXISTS `exportRevisions` (
+        `profile_id` INTEGER REFERENCES `profiles` (id),
+        `name` TEXT NOT NULL,
+        `revision` INTEGER NOT NULL,
+        PRIMARY KEY (`profile_id`, `name`));"""
+
+SELECT_EXPORT_REVISION = (
+    "SELECT revision FROM exportRevisions WHERE profile_id = ? AND name = ?"
+)
+
+UPSERT_EXPORT_REVISION = (
+    "INSERT INTO exportRevisions (profile_id, name, revision) VALUES (?, ?, ?) "
+    "ON CONFLICT (profile_id, name) DO UPDATE SET revision = excluded.revision"
+)
+
+SQL_CREATE_PROFILE_METADATA_TABLE = """
+    CREATE TABLE IF NOT EXISTS `profileMetadata` (
+        `profile_id` INTEGER REFERENCES `profiles` (id),
+        `userid` TEXT NOT NULL,
+        `bounds` TEXT NOT NULL,
+        `validation` INTEGER NOT NULL,
+        `details` TEXT,
+        `checked_at` TIMESTAMP NOT NULL,
+        PRIMARY KEY (`profile_id`, `userid`));"""
+
+SELECT_PROFILE_METADATA = (
+    "SELECT validation, details, checked_at FROM profileMetadata "
+    "WHERE profile_id = ? AND userid = ? AND bounds = ? AND checked_at >= ?"
+)
+
+UPSERT_PROFILE_METADATA = (
+    "INSERT INTO profileMetadata "
+    "(profile_id, userid, bounds, validation, details, checked_at) "
+    "VALUES (?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (profile_id, userid) DO UPDATE SET bounds = excluded.bounds, "
+    "validation = excluded.validation, details = excluded.details, "
+    "checked_at = excluded.checked_at"
+)
+
+SQL_CREATE_CANDIDATE_QUEUE_TABLE = """
+    CREATE TABLE IF NOT EXISTS `candidateQueue` (
+        `profile_id` INTEGER REFERENCES `profiles` (id),
+        `source` TEXT NOT NULL,
+        `candidate` TEXT NOT NULL,
+        `state` TEXT NOT NULL DEFAULT 'pending',
+        `enqueued_at` TIMESTAMP NOT NULL,
+        `updated_at` TIMESTAMP NOT NULL,
+        PRIMARY KEY (`profile_id`, `source`, `candidate`));"""
+
+SQL_CREATE_CANDIDATE_QUEUE_INDEX = """
+    CREATE INDEX IF NOT EXISTS `candidateQueue_source_state`
+    ON `candidateQueue` (`profile_id`, `source`, `state`, `enqueued_at`);"""
+
+INSERT_CANDIDATE = (
+    "INSERT OR IGNORE INTO candidateQueue "
+    "(profile_id, source, candidate, state, enqueued_at, updated_at) "
+    "VALUES (?, ?, ?, 'pending', ?, ?)"
+)
+
+SELECT_CANDIDATES_IN_STATE = (
+    "SELECT candidate FROM candidateQueue "
+    "WHERE profile_id = ? AND source = ? AND state = ? "
+    "ORDER BY enqueued_at, rowid LIMIT ?"
+)
+
+COUNT_CANDIDATES_BY_STATE = (
+    "SELECT state, COUNT(*) AS candidates FROM candidateQueue "
+    "WHERE profile_id = ? AND source = ? GROUP BY state"
+)
+
+UPDATE_CANDIDATE_STATE = (
+    "UPDATE candidateQueue SET state = ?, updated_at = ? "
+    "WHERE profile_id = ? AND source = ? AND candidate = ?"
+)
+
+RELEASE_CLAIMED_CANDIDATES = (
+    "UPDATE candidateQueue SET state = 'pending', updated_at = ? "
+    "WHERE profile_id = ? AND state = 'claimed'"
+)
+
+SQL_CREATE_CANDIDATE_QUEUE_FINISHED_INDEX = """
+    CREATE INDEX IF NOT EXISTS `candidateQueue_state_updated`
+    ON `candidateQueue` (`profile_id`, `state`, `updated_at`);"""
+
+DELETE_FINISHED_CANDIDATES_BEFORE = (
+    "DELETE FROM candidateQueue WHERE profile_id = ? "
+    "AND state IN ('done', 'skipped', 'failed') AND updated_at < ?"
+)
+
+# keep a single row -the one with the most `times`- of each restriction key
+SQL_DEDUPE_RESTRICTION_TABLE = """
+    DELETE FROM `{table}` WHERE rowid NOT IN (
+        SELECT rowid FROM (
+            SELECT rowid, MAX(`times`) FROM `{table}` GROUP BY {columns}));"""
+
+# the key columns and the unique index of each restriction table
+RESTRICTION_INDEXES = [
+    (
+        "friendRestriction",
+        "`profile_id`, `username`",
+        SQL_CREATE_FRIEND_RESTRICTION_INDEX,
+    ),
+    (
+        "followRestriction",
+        "`profile_id`, `username`",
+        SQL_CREATE_FOLLOW_RESTRICTION_INDEX,
+    ),
+    (
+        "inviteRestriction",
+        "`profile_id`, `pagename`, `username`",
+        SQL_CREATE_INVITE_RESTRICTION_INDEX,
+    ),
+]
+
+SELECT_FROM_FOLLOW_RESTRICTION = (
+    "SELECT times FROM followRestriction WHERE profile_id = ? AND username = ?"
+)
+
+SELECT_FOLLOW_RESTRICTIONS_OF_PROFILE = (
+    "SELECT username, times FROM followRestriction WHERE profile_id = ? "
+    "ORDER BY rowid DESC LIMIT ?"
+)
+
+SELECT_MANY_FROM_FOLLOW_RESTRICTION = (
+    "SELECT username, times FROM followRestriction WHERE profile_id = ? "
+    "AND username IN ({})"
+)
+
+# every write stamps the record with the next revision of the table, which
+# lets the exports pick up only the records changed since the last one
+UPSERT_FOLLOW_RESTRICTION = (
+    "INSERT INTO followRestriction (profile_id, username, times, revision) "
+    "VALUES (?, ?, 1, (SELECT IFNULL(MAX(revision), 0) + 1 FROM followRestriction)) "
+    "ON CONFLICT (profile_id, username) DO UPDATE SET times = times + 1, "
+    "revision = excluded.revision"
+)
+
+SELECT_FOLLOW_RESTRICTIONS_CHANGED_SINCE = (
+    "SELECT username, times, revision FROM followRestriction "
+    "WHERE revision > ? AND profile_id = ? ORDER BY revision"
+)
+
+SELECT_FROM_FRIEND_RESTRICTION = (
+    "SELECT times FROM friendRestriction WHERE profile_id = ? AND username = ?"
+)
+
+SELECT_FRIEND_RESTRICTIONS_OF_PROFILE = (
+    "SELECT username, times FROM friendRestriction WHERE profile_id = ? "
+    "ORDER BY rowid DESC LIMIT ?"
+)
+
+SELECT_MANY_FROM_FRIEND_RESTRICTION = (
+    "SELECT username, times FROM friendRestriction WHERE profile_id = ? "
+    "AND username IN ({})"
+)
+
+UPSERT_FRIEND_RESTRICTION = (
+    "INSERT INTO friendRestriction (profile_id, username, times) VALUES (?, ?, 1) "
+    "ON CONFLICT (profile_id, username) DO UPDATE SET times = times + 1"
+)
+
+SELECT_FROM_INVITE_RESTRICTION = (
+    "SELECT times FROM inviteRestriction WHERE profile_id = ? AND pagename = ? "
+    "AND username = ?"
+)
+
+SELECT_INVITE_RESTRICTIONS_OF_PROFILE = (
+    "SELECT pagename, username, times FROM inviteRestriction WHERE profile_id = ? "
+    "ORDER BY rowid DESC LIMIT ?"
+)
+
+UPSERT_INVITE_RESTRICTION = (
+    "INSERT INTO inviteRestriction (profile_id, pagename, username, times) "
+    "VALUES (?, ?, ?, 1) "
+    "ON CONFLICT (profile_id, pagename, username) DO UPDATE SET times = times + 1"
+)
+
+# statements of each restriction table; their parameters are the
+# `profile_id` followed by the key of the record - `(username,)` or
+# `(pagename, username)` - or by many usernames for "select_many"
+RESTRICTION_STATEMENTS = {
+    "followRestriction": {
+        "select": SELECT_FROM_FOLLOW_RESTRICTION,
+        "select_profile": SELECT_FOLLOW_RESTRICTIONS_OF_PROFILE,
+        "select_many": SELECT_MANY_FROM_FOLLOW_RESTRICTION,
+        "upsert": UPSERT_FOLLOW_RESTRICTION,
+    },
+    "friendRestriction": {
+        "select": SELECT_FROM_FRIEND_RESTRICTION,
+        "select_profile": SELECT_FRIEND_RESTRICTIONS_OF_PROFILE,
+        "select_many": SELECT_MANY_FROM_FRIEND_RESTRICTION,
+        "upsert": UPSERT_FRIEND_RESTRICTION,
+    },
+    "inviteRestriction": {
+        "select": SELECT_FROM_INVITE_RESTRICTION,
+        "select_profile": SELECT_INVITE_RESTRICTIONS_OF_PROFILE,
+        "upsert": UPSERT_INVITE_RESTRICTION,
+    },
+}
+
+# the counters of `recordActivity` which are rolled up into time buckets
+ACTIVITY_COUNTERS = [
+    "likes",
+    "comments",
+    "follows",
+    "unfollows",
+    "friendeds",
+    "unfriendeds",
+    "server_calls",
+]
+
+# `strftime()` format of the bucket of each rollup table
+ACTIVITY_ROLLUPS = {
+    "activityHourly": "%Y-%m-%d %H",
+    "activityDaily": "%Y-%m-%d",
+}
+
+SQL_CREATE_ACTIVITY_ROLLUP_TABLE = """
+    CREATE TABLE IF NOT EXISTS `{table}` (
+        `profile_id` INTEGER REFERENCES `profiles` (id),
+        `bucket` TEXT NOT NULL,
+        {counters},
+        PRIMARY KEY (`profile_id`, `bucket`));"""
+
+# add the counters of a `recordActivity` row to the bucket it falls into;
+# `{sign}` and `{row}` pick what to add (`+`, `NEW`) or take back (`-`, `OLD`)
+SQL_UPSERT_ACTIVITY_ROLLUP = """
+        INSERT INTO `{table}` (`profile_id`, `bucket`, {columns})
+        VALUES ({row}.profile_id, strftime('{format}', {row}.created), {values})
+        ON CONFLICT (`profile_id`, `bucket`) DO UPDATE SET {updates};"""
+
+# keep the rollups up to date on every write of `update_activity()`; deleted
+# raw rows are left out on purpose so that pruning them keeps the rollups
+SQL_CREATE_ACTIVITY_TRIGGER = """
+    CREATE TRIGGER IF NOT EXISTS `recordActivity_{event}_rollup`
+    AFTER {event} ON `recordActivity`
+    BEGIN{statements}
+    END;"""
+
+SQL_BACKFILL_ACTIVITY_ROLLUP = """
+    INSERT INTO `{table}` (`profile_id`, `bucket`, {columns})
+    SELECT `profile_id`, strftime('{format}', `created`), {sums}
+    FROM `recordActivity` GROUP BY 1, 2;"""
+
+SQL_CREATE_RECORD_ACTIVITY_INDEX = """
+    CREATE INDEX IF NOT EXISTS `recordActivity_profile_created`
+    ON `recordActivity` (`profile_id`, `created`);"""
+
+SELECT_ACTIVITY_ROLLUP = (
+    "SELECT * FROM {table} WHERE profile_id = ? AND bucket >= ? AND bucket <= ? "
+    "ORDER BY bucket"
+)
+
+DELETE_ACTIVITY_BEFORE = (
+    "DELETE FROM recordActivity WHERE profile_id = ? AND created < ?"
+)
+
+# stay below SQLite's default limit of 999 parameters per statement
+MAX_PARAMETERS_PER_QUERY = 900
+
+
+class ConnectionManager:
+    """
+    Hand out long-lived SQLite connections shared by the DB helpers.
+
+    Every thread gets its own connection per database address, which is
+    opened on first use and kept until `close_all()` is called at the end of
+    the session. Since the connections live for the whole session, SQLite's
+    per-connection statement cache keeps the helpers' queries prepared.
+    """
+
+    def __init__(self, cached_statements=128):
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def get(self, address):
+        """ Return the connection of the calling thread for the given DB """
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+
+        conn = connections.get(address)
+        if conn is None:
+            # `close_all()` may run from another thread, so do not tie the
+            # connection object to the thread which opened it
+            conn = sqlite3.connect(
+                address,
+                cached_statements=self.cached_statements,
+                check_same_thread=False,
+            )
+            conn.row_factory = sqlite3.Row
+            connections[address] = conn
+
+            with self._lock:
+                self._connections.append(conn)
+
+        return conn
+
+    def close_all(self):
+        """ Close every connection opened in any thread """
+        with self._lock:
+            connections, self._connections = self._connections, []
+            # drop the per-thread references to the closed connections
+            self._local = threading.local()
+
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+
+# a single manager serves the whole process
+connection_manager = ConnectionManager()
+
+
+# DB address and profile id already resolved in this process, by the DB
+# location and the profile name they were resolved for
+resolved_databases = {}
+
 
 def get_database(Settings, make=False):
     address = Settings.DATABASE_LOCATION
@@ -59,6 +398,13 @@ def get_database(Settings, make=False):
     credentials = Settings.profile
 
     id, name = credentials["id"], credentials["name"]
+
+    # skip the path checks on the hot path, the location and profile name
+    # are all it depends on
+    resolved = resolved_databases.get((address, name))
+    if resolved is not None and not make:
+        return resolved
+
     address = validate_database_address(Settings)
 
     if not os.path.isfile(address) or make:
@@ -66,9 +412,117 @@ def get_database(Settings, make=False):
 
     id = get_profile(name, address, logger, Settings) if id is None or make else id
 
+    resolved_databases[(Settings.DATABASE_LOCATION, name)] = address, id
+
     return address, id
 
 
+def get_connection(address):
+    """ Get the session-wide connection to the DB at the given address """
+    return connection_manager.get(address)
+
+
+def close_connections():
+    """ Close the session-wide DB connections, e.g. while ending a session """
+    connection_manager.close_all()
+
+
+def select_restriction_times(conn, table, profile_id, usernames):
+    """ Get the restriction times of many usernames in a few queries """
+    usernames = list(set(usernames))
+    sql = RESTRICTION_STATEMENTS[table]["select_many"]
+    found = {}
+
+    with conn:
+        cur = conn.cursor()
+
+        for start in range(0, len(usernames), MAX_PARAMETERS_PER_QUERY):
+            chunk = usernames[start : start + MAX_PARAMETERS_PER_QUERY]
+            cur.execute(sql.format(", ".join(["?"] * len(chunk))), [profile_id] + chunk)
+            for row in cur:
+                found[row[0]] = row[1]
+
+    return found
+
+
+def select_activity(address, profile_id, period="hourly", since=None, until=None):
+    """
+    Return the action counts of the profile per hour or per day, from the
+    rollup tables, as dicts with the `bucket` and a key per counter.
+
+    `since` and `until` are datetimes bounding the buckets (both included).
+    """
+    table = {"hourly": "activityHourly", "daily": "activityDaily"}[period]
+    bucket_format = ACTIVITY_ROLLUPS[table]
+    since = since.strftime(bucket_format) if since else ""
+    # every bucket sorts before this one
+    until = until.strftime(bucket_format) if until else "9999"
+
+    conn = get_connection(address)
+    with conn:
+        cur = conn.cursor()
+        cur.execute(
+            SELECT_ACTIVITY_ROLLUP.format(table=table), (profile_id, since, until)
+        )
+        return [dict(row) for row in cur]
+
+
+def prune_activity(address, profile_id, days, logger):
+    """ Delete the raw activity rows older than `days`; the hourly and daily
+    rollups keep their counts """
+    cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+
+    try:
+        conn = get_connection(address)
+        with conn:
+            cur = conn.cursor()
+            cur.execute(DELETE_ACTIVITY_BEFORE, (profile_id, cutoff))
+            pruned = cur.rowcount
+
+    except Exception as exc:
+        logger.error(
+            "Dap! Error occurred while pruning the activity records:\n\t{}".format(
+                str(exc).encode("utf-8")
+            )
+        )
+        return 0
+
+    if pruned:
+        logger.info(
+            "Pruned {} activity records older than {} days".format(pruned, days)
+        )
+
+    return pruned
+
+
+def prune_candidate_queue(address, profile_id, days, logger):
+    """ Delete the queued candidates acted on more than `days` ago; the
+    pending and claimed ones stay in line """
+    cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+
+    try:
+        conn = get_connection(address)
+        with conn:
+            cur = conn.cursor()
+            cur.execute(DELETE_FINISHED_CANDIDATES_BEFORE, (profile_id, cutoff))
+            pruned = cur.rowcount
+
+    except Exception as exc:
+        logger.error(
+            "Dap! Error occurred while pruning the candidate queue:\n\t{}".format(
+                str(exc).encode("utf-8")
+            )
+        )
+        return 0
+
+    if pruned:
+        logger.info(
+            "Pruned {} queued candidates finished over {} days ago".format(pruned, days)
+        )
+
+    return pruned
+
+
 def create_database(address, logger, name):
     try:
         connection = sqlite3.connect(address)
@@ -90,6 +544,8 @@ def create_database(address, logger, name):
 
             connection.commit()
 
+        run_migrations(connection, logger)
+
     except Exception as exc:
         logger.warning(
             "Wah! Error occurred while getting a DB for '{}':\n\t{}".format(
@@ -123,6 +579,168 @@ def create_tables(cursor, tables):
         cursor.execute(SQL_CREATE_ACCOUNTS_PROGRESS_TABLE)
 
 
+def index_restriction_tables(cursor):
+    """
+    Give the restriction tables a unique index over their keys.
+
+    Databases created before the indexes existed may hold duplicate keys, so
+    those are merged first -keeping the highest `times`- or else the unique
+    index could not be created.
+    """
+    for table, columns, sql_create_index in RESTRICTION_INDEXES:
+        cursor.execute(
+            SQL_DEDUPE_RESTRICTION_TABLE.format(table=table, columns=columns)
+        )
+        cursor.execute(sql_create_index)
+
+
+def add_follow_restriction_revisions(cursor):
+    """ Track the revision of each follow restriction for incremental exports """
+    cursor.execute(
+        "ALTER TABLE `followRestriction` "
+        "ADD COLUMN `revision` INTEGER NOT NULL DEFAULT 0"
+    )
+    # the existing records keep their insertion order
+    cursor.execute("UPDATE `followRestriction` SET `revision` = rowid")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS `followRestriction_revision` "
+        "ON `followRestriction` (`revision`)"
+    )
+    cursor.execute(SQL_CREATE_EXPORT_REVISION_TABLE)
+
+
+def upsert_activity_rollup(table, row, sign):
+    """ Build the UPSERT adding (or taking back) a raw row to its bucket """
+    return SQL_UPSERT_ACTIVITY_ROLLUP.format(
+        table=table,
+        row=row,
+        format=ACTIVITY_ROLLUPS[table],
+        columns=", ".join(ACTIVITY_COUNTERS),
+        values=", ".join(
+            "{}{}.{}".format(sign, row, counter) for counter in ACTIVITY_COUNTERS
+        ),
+        updates=", ".join(
+            "{0} = {0} + excluded.{0}".format(counter) for counter in ACTIVITY_COUNTERS
+        ),
+    )
+
+
+def add_activity_rollups(cursor):
+    """ Roll up the activity into hourly and daily buckets """
+    columns = ", ".join(ACTIVITY_COUNTERS)
+    inserts, updates = "", ""
+
+    for table, bucket_format in ACTIVITY_ROLLUPS.items():
+        cursor.execute(
+            SQL_CREATE_ACTIVITY_ROLLUP_TABLE.format(
+                table=table,
+                counters=",\n        ".join(
+                    "`{}` INTEGER NOT NULL DEFAULT 0".format(counter)
+                    for counter in ACTIVITY_COUNTERS
+                ),
+            )
+        )
+        cursor.execute(
+            SQL_BACKFILL_ACTIVITY_ROLLUP.format(
+                table=table,
+                format=bucket_format,
+                columns=columns,
+                sums=", ".join(
+                    "SUM(`{}`)".format(counter) for counter in ACTIVITY_COUNTERS
+                ),
+            )
+        )
+
+        inserts += upsert_activity_rollup(table, "NEW", "")
+        # an update moves the difference, even across buckets
+        updates += upsert_activity_rollup(table, "OLD", "-")
+        updates += upsert_activity_rollup(table, "NEW", "")
+
+    cursor.execute(
+        SQL_CREATE_ACTIVITY_TRIGGER.format(event="INSERT", statements=inserts)
+    )
+    cursor.execute(
+        SQL_CREATE_ACTIVITY_TRIGGER.format(event="UPDATE", statements=updates)
+    )
+    cursor.execute(SQL_CREATE_RECORD_ACTIVITY_INDEX)
+
+
+def add_profile_metadata(cursor):
+    """ Keep the outcome of validating a user for the later validations """
+    cursor.execute(SQL_CREATE_PROFILE_METADATA_TABLE)
+
+
+def add_candidate_queue(cursor):
+    """ Queue the harvested candidates of the features until acted on """
+    cursor.execute(SQL_CREATE_CANDIDATE_QUEUE_TABLE)
+    cursor.execute(SQL_CREATE_CANDIDATE_QUEUE_INDEX)
+
+
+def index_finished_candidates(cursor):
+    """ Find the candidates acted on long ago to prune them """
+    cursor.execute(SQL_CREATE_CANDIDATE_QUEUE_FINISHED_INDEX)
+
+
+# ordered schema changes on top of the tables of `create_tables()`; the
+# number of the last applied one is kept in the DB's `user_version`.
+# NEVER edit or reorder a released migration, append a new one instead
+MIGRATIONS = [
+    (1, "unique indexes on restriction tables", index_restriction_tables),
+    (2, "revisions of follow restrictions", add_follow_restriction_revisions),
+    (3, "hourly and daily activity rollups", add_activity_rollups),
+    (4, "validated profile metadata", add_profile_metadata),
+    (5, "candidate work queue", add_candidate_queue),
+    (6, "index of finished queued candidates", index_finished_candidates),
+]
+
+
+def get_schema_version(cursor):
+    cursor.execute("PRAGMA user_version")
+    return cursor.fetchone()[0]
+
+
+def run_migrations(connection, logger):
+    """
+    Bring the DB schema up to date by applying the pending migrations.
+
+    Each migration runs in its own transaction together with the bump of
+    `user_version`, so an interrupted one is rolled back and tried again
+    next time.
+    """
+    # take over the transaction control from the `sqlite3` module
+    isolation_level = connection.isolation_level
+    connection.isolation_level = None
+    cursor = connection.cursor()
+
+    try:
+        version = get_schema_version(cursor)
+
+        for number, description, migrate in MIGRATIONS:
+            if number <= version:
+                continue
+
+            start_time = time.time()
+            cursor.execute("BEGIN")
+            try:
+                migrate(cursor)
+                # PRAGMA does not take parameters; `number` is our own int
+                cursor.execute("PRAGMA user_version = {}".format(int(number)))
+                cursor.execute("COMMIT")
+
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+
+            logger.info(
+                "Applied DB migration #{} ({}) in {:.3f} seconds".format(
+                    number, description, time.time() - start_time
+                )
+            )
+
+    finally:
+        connection.isolation_level = isolation_level
+
+
 def verify_database_directories(address):
     db_dir = os.path.dirname(address)
     if not os.path.exists(db_dir):
@@ -5,10 +5,11 @@ from math import ceil
 import random
 import traceback
 import os
-import sqlite3
 from pyvirtualdisplay import Display
 import logging
 from contextlib import contextmanager
+from contextlib import closing
+from itertools import islice
 import unicodedata
 from sys import exit as clean_exit
 from tempfile import gettempdir
@@ -23,24 +24,60 @@ from .login_util import login_user
 from socialcommons.print_log_writer import log_follower_num
 from socialcommons.print_log_writer import log_following_num
 
-from socialcommons.time_util import sleep
+from .clock import sleep
 from socialcommons.util import validate_userid
 from socialcommons.util import interruption_handler
 from socialcommons.util import highlight_print
 from socialcommons.util import truncate_float
 from socialcommons.util import save_account_progress
 from socialcommons.util import parse_cli_args
-from .unfollow_util import get_given_user_followers
+from .unfollow_util import iter_given_user_followers
 from .unfollow_util import unfollow_user
 from .unfollow_util import follow_user
 from .unfollow_util import follow_restriction
+from .unfollow_util import filter_follow_restricted
 from .unfollow_util import dump_follow_restriction
+from .unfollow_util import compact_follow_restriction
 from .unfriend_util import friend_user
 from .unfriend_util import unfriend_user
 from .unfriend_util import unfriend_user_by_url
-from .commenters_util import users_liked
+from .unfriend_util import filter_friend_restricted
+from .commenters_util import iter_users_liked
 from .commenters_util import get_post_urls_from_profile
+from .browser_util import remember_implicit_wait
+from .browser_util import probe_one
+from .browser_util import PROBE_TIMEOUT
+from .browser_util import extract_links
+from .browser_util import parse_friend_rows
+from .browser_util import scroll_until_stable
+from .browser_util import rewrite_urls
+from .selectors import Selectors
+from .wait_util import wait_for
+from .wait_util import timed_feature
+from .wait_util import feature_time_report
+from .wait_util import clear_feature_times
+from .command_profiler import CommandProfiler
 from .database_engine import get_database
+from .database_engine import close_connections
+from .database_engine import select_activity
+from .database_engine import prune_activity
+from .database_engine import prune_candidate_queue
+from .restriction_cache import get_restriction_cache
+from .restriction_cache import clear_restriction_caches
+from .profile_cache import get_profile_cache
+from .profile_cache import clear_profile_caches
+from .work_queue import get_work_queue
+from .seen_index import get_seen_index
+from .seen_index import filter_seen
+from .seen_index import record_seen
+from .seen_index import save_seen_indexes
+from .work_queue import PENDING
+from .work_queue import DONE
+from .work_queue import SKIPPED
+from .work_queue import FAILED
+from .write_behind import start_write_behind
+from .write_behind import flush_write_behind
+from .write_behind import stop_write_behind
 from socialcommons.browser import set_selenium_local_session
 from socialcommons.browser import close_browser
 from socialcommons.file_manager import get_workspace
@@ -51,6 +88,12 @@ from selenium.common.exceptions import NoSuchElementException
 from socialcommons.exceptions import SocialPyError
 from .settings import Settings
 
+# the page search results which `add_likers_from_term()` explores
+PAGE_RESULTS_SELECTOR = "div > div._4bl9 > div > div:nth-child(2) > div._glm > div > a"
+
+# rows to load per user to add; most are pending, unnamed or friended before
+ROWS_PER_ADD = 3
+
 HOME = "/Users/ishandutta2007"
 CWD = HOME + "/Documents/Projects/FacebookPy"
 
@@ -77,6 +120,9 @@ class FacebookPy:
         bypass_suspicious_attempt=False,
         bypass_with_mobile=False,
         multi_logs=True,
+        profile_commands=False,
+        profile_commands_path=None,
+        replay_address=None,
     ):
 
         cli_args = parse_cli_args()
@@ -113,6 +159,13 @@ class FacebookPy:
         self.bypass_suspicious_attempt = bypass_suspicious_attempt
         self.bypass_with_mobile = bypass_with_mobile
         self.disable_image_load = disable_image_load
+        # count & time the WebDriver commands per feature, optionally dumped
+        # to a JSON at `profile_commands_path` when the session ends
+        self.profile_commands = profile_commands
+        self.profile_commands_path = profile_commands_path
+        self.command_profiler = None
+        # serve the facebook.com pages from e.g. benchmarks/replay_server.py
+        self.replay_address = replay_address
 
         self.username = username or os.environ.get("FACEBOOK_USER")
         self.password = password or os.environ.get("FACEBOOK_PW")
@@ -158,6 +211,8 @@ class FacebookPy:
         self.already_invited = 0
         self.inap_img = 0
         self.not_valid_users = 0
+        self.profile_cache_hits = 0
+        self.profile_cache_misses = 0
         self.video_played = 0
         self.already_Visited = 0
 
@@ -261,6 +316,8 @@ class FacebookPy:
 
         # IMPORTANT: think twice before relocating
         get_database(Settings, make=True)
+        # load the restriction history of the profile once for the session
+        get_restriction_cache(Settings)
 
         if self.selenium_local_session is True:
             self.set_selenium_local_session(Settings)
@@ -320,6 +377,15 @@ class FacebookPy:
         if len(err_msg) > 0:
             raise SocialPyError(err_msg)
 
+        remember_implicit_wait(self.browser, self.page_delay)
+
+        if self.replay_address:
+            rewrite_urls(self.browser, self.replay_address)
+
+        if self.profile_commands:
+            self.command_profiler = CommandProfiler(self.browser).install()
+
+    @timed_feature
     def login(self):
         """Used to login the user either with the username and password"""
         if not login_user(
@@ -390,6 +456,91 @@ class FacebookPy:
 
         return self
 
+    def set_write_behind(
+        self, enabled=False, flush_interval=500, batch_size=100, durability="normal"
+    ):
+        """Defines if the DB writes should be batched in the background"""
+        if self.aborting:
+            return self
+
+        if enabled:
+            address, _ = get_database(Settings)
+            start_write_behind(
+                address, flush_interval, batch_size, durability, self.logger
+            )
+        else:
+            stop_write_behind()
+
+        return self
+
+    def set_activity_retention(self, days=None):
+        """Defines for how many days the raw activity records are kept, the
+        hourly and daily counts stay available after pruning"""
+        if self.aborting:
+            return self
+
+        if days is not None and days < 1:
+            self.logger.warning("Activity retention must be at least 1 day")
+            days = 1
+
+        Settings.activity_retention_days = days
+
+        return self
+
+    def set_candidate_queue_retention(self, days=30):
+        """Defines for how many days the queued users which were acted on
+        are kept, pending ones are never pruned"""
+        if self.aborting:
+            return self
+
+        if days is not None and days < 1:
+            self.logger.warning("Candidate queue retention must be at least 1 day")
+            days = 1
+
+        Settings.candidate_queue_retention_days = days
+
+        return self
+
+    def set_profile_cache(self, enabled=False, ttl_hours=24, negative_ttl_hours=1):
+        """Defines if the validations of users are reused, and for how many
+        hours, instead of visiting their profiles again; failed validations
+        are reused for `negative_ttl_hours` only"""
+        if self.aborting:
+            return self
+
+        Settings.profile_cache_ttl = ttl_hours if enabled else None
+        Settings.profile_cache_negative_ttl = negative_ttl_hours
+
+        return self
+
+    def set_seen_index(self, enabled=False):
+        """Defines if the users harvested by any feature are remembered, with
+        the outcome, and left out when harvested again, also after restarts"""
+        if self.aborting:
+            return self
+
+        Settings.seen_index_folder = self.logfolder if enabled else None
+
+        return self
+
+    def get_activity(self, period="daily", since=None, until=None):
+        """Returns the action counts of the profile per hour or per day"""
+        address, id = get_database(Settings)
+        return select_activity(address, id, period, since, until)
+
+    def compact_follow_restriction(self):
+        """Rewrites the follow restriction export with the latest record of
+        each user only"""
+        if self.aborting:
+            return self
+
+        records = compact_follow_restriction(self.logfolder, self.logger)
+        self.logger.info(
+            "Compacted the follow restriction export to {} records".format(records)
+        )
+
+        return self
+
     def set_user_interact(self, amount=10, percentage=100, randomize=False, media=None):
         """Define if posts of given user should be interacted"""
         if self.aborting:
@@ -412,25 +563,24 @@ class FacebookPy:
 
         return self
 
+    @timed_feature
     def fetch_birthdays(self):
         self.browser.get("https://www.facebook.com/{}/friends".format(self.userid))
-        time.sleep(2)
         try:
-            for i in range(10):
-                # self.browser.execute_script("window.scrollTo(0, " + str(1000+i*1000) + ")")
-                self.browser.execute_script(
-                    "window.scrollTo(0, document.body.scrollHeight);"
-                )
-                time.sleep(2)
-
-            profile_as = self.browser.find_elements_by_css_selector(
+            profile_selector = (
                 "li > div > div > div.uiProfileBlockContent > div > div:nth-child(2) > div > a"
             )
+            wait_for(self.browser, "list rendered", profile_selector)
+            scroll_until_stable(
+                self.browser, profile_selector, idle_timeout=2, max_scrolls=10
+            )
+
+            profile_links = extract_links(self.browser, profile_selector)
 
-            self.logger.info("Found {} profiles".format(len(profile_as)))
+            self.logger.info("Found {} profiles".format(len(profile_links)))
             profiles = []
-            for profile_a in profile_as:
-                friend_url = profile_a.get_attribute("href").split("?")[0].split("#")[0]
+            for profile_link in profile_links:
+                friend_url = profile_link["href"].split("?")[0].split("#")[0]
                 if len(friend_url.split("/")) > 4:
                     continue
                 profiles.append(friend_url)
@@ -454,6 +604,7 @@ class FacebookPy:
             self.logger.error(e)
             traceback.print_exc()
 
+    @timed_feature
     def follow_likers(
         self,
         userids,
@@ -462,6 +613,7 @@ class FacebookPy:
         randomize=True,
         sleep_delay=600,
         interact=False,
+        harvest_only=False,
     ):
         """ Follows users' likers """
 
@@ -499,32 +651,61 @@ class FacebookPy:
         # `10` instead of this quitely randomized score
         self.quotient_breach = False
 
+        queue = get_work_queue(Settings)
+        seen = get_seen_index(Settings, "follow")
+        # the likers to follow of each user
+        wanted = photos_grab_amount * follow_likers_per_photo
+
         for userid in userids:
             if self.quotient_breach:
                 break
 
-            post_urls = get_post_urls_from_profile(
-                self.browser, userid, self.logger, photos_grab_amount, randomize
-            )
-            sleep(1)
-            if not isinstance(post_urls, list):
-                post_urls = [post_urls]
-
-            # self.logger.info('post_urls:')
-            # self.logger.info(post_urls)
+            source = "likers:{}".format(userid)
 
-            for post_url in post_urls:
-                if self.quotient_breach:
-                    break
+            # likers queued by an earlier run are followed before grabbing
+            # more of them
+            queued = queue.pending(source)
+            if queued >= wanted:
+                self.logger.info(
+                    "Resuming with {} queued likers of '{}'".format(queued, userid)
+                )
 
-                likers = users_liked(
-                    self.browser, post_url, self.logger, follow_likers_per_photo
+            else:
+                post_urls = get_post_urls_from_profile(
+                    self.browser, userid, self.logger, photos_grab_amount, randomize
                 )
-                # This way of iterating will prevent sleep interference
-                # between functions
-                random.shuffle(likers)
+                sleep(1)
+                if not isinstance(post_urls, list):
+                    post_urls = [post_urls]
 
-                for liker in likers[:follow_likers_per_photo]:
+                for post_url in post_urls:
+                    # the photos left need not be opened once enough are queued
+                    if queued >= wanted:
+                        break
+
+                    # the likers dialog is scrolled only until enough of its
+                    # likers are queued
+                    queued += self.queue_harvested(
+                        iter_users_liked(self.browser, post_url, self.logger, None),
+                        queue,
+                        source,
+                        min(follow_likers_per_photo, wanted - queued),
+                        seen,
+                        skip_followed=True,
+                    )
+
+            if harvest_only:
+                continue
+
+            claimed = queue.claim(source, wanted)
+            # some may have been followed since they were queued
+            likers = filter_follow_restricted(claimed, self.follow_times, self.logger)
+            queue.finish(source, set(claimed) - set(likers), SKIPPED)
+            record_seen(seen, set(claimed) - set(likers), SKIPPED)
+            handled = []
+
+            try:
+                for liker in likers:
                     if self.quotient_breach:
                         self.logger.warning(
                             "--> Follow quotient reached its peak!"
@@ -536,6 +717,11 @@ class FacebookPy:
                         followed = self.follow_by_list(
                             liker, self.follow_times, sleep_delay, interact
                         )
+                    outcome = DONE if followed > 0 else SKIPPED
+                    queue.finish(source, liker, outcome)
+                    record_seen(seen, liker, outcome)
+                    handled.append(liker)
+
                     if followed > 0:
                         followed_all += 1
                         followed_new += 1
@@ -559,6 +745,9 @@ class FacebookPy:
                             sleep(delay_random)
                             relax_point = random.randint(7, 14)
                             followed_new = 0
+            finally:
+                # the likers left by a quotient breach or an error stay in line
+                queue.finish(source, set(likers) - set(handled), PENDING)
 
         self.logger.info("Finished following Likers!\n")
 
@@ -583,6 +772,7 @@ class FacebookPy:
 
         return self
 
+    @timed_feature
     def friend_by_list(self, friendlist, times=1, sleep_delay=600, interact=False):
         self.logger.info("====Start friend_by_list===")
         self.logger.info("About to friend following: {}".format(friendlist))
@@ -599,6 +789,7 @@ class FacebookPy:
             )
         self.logger.info("====End of friend_by_list===")
 
+    @timed_feature
     def unfriend_by_list(self, friendlist, pagename, check_invite=True, sleep_delay=6):
         self.logger.info("====Start unfriend_by_list===")
         self.logger.info("About to unfriend following: {}".format(friendlist))
@@ -628,6 +819,7 @@ class FacebookPy:
                 self.unfriended += 1
         self.logger.info("====End of unfriend_by_list===")
 
+    @timed_feature
     def unfriend_by_urllist(self, urllist, sleep_delay=6):
         self.logger.info("====Start unfriend_by_urllist===")
         self.logger.info("About to unfriend following: {}".format(urllist))
@@ -647,6 +839,7 @@ class FacebookPy:
                 self.unfriended += 1
         self.logger.info("====End of unfriend_by_urllist===")
 
+    @timed_feature
     def follow_by_list(self, followlist, times=1, sleep_delay=600, interact=False):
         """Allows to follow by any scrapped list"""
         self.logger.info("====Start follow_by_list===")
@@ -671,6 +864,11 @@ class FacebookPy:
 
         self.follow_times = times or 0
 
+        # leave out the already followed users before visiting any
+        followlist = filter_follow_restricted(
+            followlist, self.follow_times, self.logger
+        )
+
         followed_all = 0
         followed_new = 0
         already_followed = 0
@@ -847,12 +1045,10 @@ class FacebookPy:
         self.min_posts = min_posts if enabled is True else None
         self.max_posts = max_posts if enabled is True else None
 
+    @timed_feature
     def validate_user_call(self, user_name):
         """ Short call of validate_userid() function """
-        validation, details = validate_userid(
-            self.browser,
-            "https://facebook.com/",
-            user_name,
+        bounds = [
             self.username,
             self.userid,
             self.ignore_users,
@@ -873,69 +1069,51 @@ class FacebookPy:
             self.skip_business_percentage,
             self.skip_business_categories,
             self.dont_skip_business_categories,
-            self.logger,
-            self.logfolder,
-            Settings,
+        ]
+
+        cache = get_profile_cache(Settings)
+        if cache is not None:
+            cached = cache.lookup(user_name, bounds)
+            if cached is not None:
+                self.profile_cache_hits += 1
+                return cached
+            self.profile_cache_misses += 1
+
+        validation, details = validate_userid(
+            self.browser,
+            "https://facebook.com/",
+            user_name,
+            *(bounds + [self.logger, self.logfolder, Settings])
         )
+
+        if cache is not None:
+            cache.store(user_name, bounds, validation, details)
+
         return validation, details
 
     def invite_restriction(self, operation, pagename, username, limit, logger):
         """ Keep track of the followed users and help avoid excessive follow of
         the same user """
         try:
-            # get a DB and start a connection
-            db, id = get_database(Settings)
-            conn = sqlite3.connect(db)
-
-            with conn:
-                conn.row_factory = sqlite3.Row
-                cur = conn.cursor()
-
-                cur.execute(
-                    "SELECT * FROM inviteRestriction WHERE profile_id=:id_var "
-                    "AND pagename=:page_var AND username=:name_var",
-                    {"id_var": id, "page_var": pagename, "name_var": username},
-                )
-                data = cur.fetchone()
-                invite_data = dict(data) if data else None
-
-                if operation == "write":
-                    if invite_data is None:
-                        # write a new record
-                        cur.execute(
-                            "INSERT INTO inviteRestriction (profile_id, "
-                            "pagename, username, times) VALUES (?, ?, ?, ?)",
-                            (id, pagename, username, 1),
-                        )
-                    else:
-                        # update the existing record
-                        invite_data["times"] += 1
-                        sql = (
-                            "UPDATE inviteRestriction set times = ? WHERE "
-                            "profile_id=? AND pagename = ? AND username = ?"
-                        )
-                        cur.execute(sql, (invite_data["times"], id, pagename, username))
+            cache = get_restriction_cache(Settings)
 
-                    # commit the latest changes
-                    conn.commit()
+            if operation == "write":
+                cache.write("inviteRestriction", (pagename, username))
 
-                elif operation == "read":
-                    if invite_data is None:
-                        return False
+            elif operation == "read":
+                times = cache.times("inviteRestriction", (pagename, username))
 
-                    elif invite_data["times"] < limit:
-                        return False
+                if not times or times < limit:
+                    return False
 
-                    else:
-                        exceed_msg = (
-                            "" if invite_data["times"] == limit else "more than "
-                        )
-                        logger.info(
-                            "---> {} has already been invited {}{} times".format(
-                                username, exceed_msg, str(limit)
-                            )
+                else:
+                    exceed_msg = "" if times == limit else "more than "
+                    logger.info(
+                        "---> {} has already been invited {}{} times".format(
+                            username, exceed_msg, str(limit)
                         )
-                        return True
+                    )
+                    return True
         except Exception as exc:
             logger.error(
                 "Dap! Error occurred with invite Restriction:\n\t{}".format(
@@ -943,9 +1121,6 @@ class FacebookPy:
                 )
             )
             traceback.print_exc()
-        finally:
-            if conn:
-                conn.close()
 
     def fetch_smart_comments(self, is_video, temp_comments):
         if temp_comments:
@@ -958,6 +1133,7 @@ class FacebookPy:
 
         return comments
 
+    @timed_feature
     def confirm_friends(self, max_confirms=100, sleep_delay=6):
         self.browser.get("https://www.facebook.com/friends/requests/")
         delay_random = random.randint(
@@ -999,6 +1175,7 @@ class FacebookPy:
             self.logger.error(e)
         return confirms
 
+    @timed_feature
     def add_suggested_friends(self, max_confirms=100, sleep_delay=6):
         self.browser.get("https://www.facebook.com/friends/requests/")
         delay_random = random.randint(
@@ -1046,26 +1223,32 @@ class FacebookPy:
             self.logger.error(e)
         return adds
 
+    @timed_feature
     def get_recent_friends(self):
         self.logger.info("====Start get_recent_friends===")
         self.browser.get(
             "https://www.facebook.com/{}/friends_recent".format(self.userid)
         )
-        sleep(5)
+        wait_for(self.browser, "list rendered", Selectors.friend_links_css)
+        rendered = len(extract_links(self.browser, Selectors.friend_links_css))
         self.browser.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        sleep(5)
-        friend_elems = self.browser.find_elements_by_css_selector(
-            "ul > li > div > div > div.uiProfileBlockContent > div > div:nth-child(2) > div > a"
+        # the next friends show up, if there are any
+        wait_for(
+            self.browser,
+            "list rendered",
+            Selectors.friend_links_css,
+            count=rendered + 1,
+            timeout=5,
         )
-        self.logger.info("Total recent friends found = {}".format(len(friend_elems)))
-        sleep(10)
-        # print(friend_elems)
+        friend_links = extract_links(self.browser, Selectors.friend_links_css)
+        self.logger.info("Total recent friends found = {}".format(len(friend_links)))
+        # print(friend_links)
         friends = []
         corrup_indices = []
-        for idx, friend_elem in enumerate(friend_elems):
+        for idx, friend_link in enumerate(friend_links):
             try:
-                uid = friend_elem.get_attribute("href").split("?")[0].split("/")[3]
-                if uid == "profile.php":
+                uid = friend_link["username"]
+                if uid is None:
                     self.logger.info("Skipping unnamed friend")
                     continue
                 if uid == self.userid:
@@ -1079,23 +1262,22 @@ class FacebookPy:
         self.logger.info("====End of get_recent_friends===")
         return friends
 
+    @timed_feature
     def get_recent_unnamed_friend_urls(self):
         self.logger.info("====Start get_recent_unnamed_friend_urls===")
         self.browser.get(
             "https://www.facebook.com/{}/friends_recent".format(self.userid)
         )
-        friend_elems = self.browser.find_elements_by_css_selector(
-            "ul > li > div > div > div.uiProfileBlockContent > div > div:nth-child(2) > div > a"
-        )
+        friend_links = extract_links(self.browser, Selectors.friend_links_css)
         friend_urls = []
-        for friend_elem in friend_elems:
-            uid = friend_elem.get_attribute("href").split("?")[0].split("/")[3]
-            if uid != "profile.php":
+        for friend_link in friend_links:
+            if friend_link["username"] is not None:
                 continue
-            friend_urls.append(friend_elem.get_attribute("href"))
+            friend_urls.append(friend_link["href"])
         self.logger.info("====End of get_recent_unnamed_friend_urls===")
         return friend_urls
 
+    @timed_feature
     def withdraw_outgoing_friends_requests(self, ignore_few=True, sleep_delay=6):
         self.logger.info("====Start withdraw_outgoing_friends_requests===")
         delay_random = random.randint(
@@ -1125,9 +1307,14 @@ class FacebookPy:
                 msg = ""
                 for o in options:
                     try:
-                        cancel_request_button = self.browser.find_element_by_xpath(
-                            "//*[contains(text(), '" + o + "')]"
+                        cancel_request_button = probe_one(
+                            self.browser,
+                            "//*[contains(text(), '" + o + "')]",
+                            timeout=PROBE_TIMEOUT,
                         )
+                        if cancel_request_button is None:
+                            msg = "No '{}' option".format(o)
+                            continue
                         cancel_request_button.click()
                         self.withdrawn += 1
                         sleep(delay_random)
@@ -1154,7 +1341,7 @@ class FacebookPy:
 
     def refresh_links(self):
         likers_buttons = self.browser.find_elements_by_css_selector(
-            "div > div._4bl9 > div > div:nth-child(2) > div._glm > div > a"
+            PAGE_RESULTS_SELECTOR
         )
         likers_buttons.extend(
             self.browser.find_elements_by_css_selector(
@@ -1163,168 +1350,267 @@ class FacebookPy:
         )
         return likers_buttons
 
-    def add_likers_from_term(self, search_term):
+    @timed_feature
+    def add_likers_from_term(
+        self, search_term, max_add=20, sleep_delay=6, harvest_only=False
+    ):
         self.logger.info("===About to add_likers_from_term: {}".format(search_term))
-        search_url = (
-            "https://www.facebook.com/search/pages/?q=" + search_term + "&epa=SERP_TAB"
+        delay_random = random.randint(
+            ceil(sleep_delay * 0.85), ceil(sleep_delay * 1.14)
         )
-        self.browser.get(search_url)
-        for i in range(20):
-            self.browser.execute_script(
-                "window.scrollTo(0, document.body.scrollHeight);"
+        queue = get_work_queue(Settings)
+        source = "term:{}".format(search_term)
+
+        # likers queued by an earlier run are added before harvesting more
+        queued = queue.pending(source)
+        if queued >= max_add:
+            self.logger.info(
+                "Resuming with {} queued likers of pages found by: {}".format(
+                    queued, search_term
+                )
+            )
+        else:
+            search_url = (
+                "https://www.facebook.com/search/pages/?q="
+                + search_term
+                + "&epa=SERP_TAB"
             )
+            self.browser.get(search_url)
+            scroll_until_stable(self.browser, PAGE_RESULTS_SELECTOR, idle_timeout=3)
 
-        likers_buttons = self.refresh_links()
-        sleep(2)
-        links = []
-        added = 0
-        likers_indices = list(range(len(likers_buttons)))
-        random.shuffle(likers_indices)
-        self.logger.info(
-            "Will explore pages in following order of index: {}".format(likers_indices)
-        )
-        for i in likers_indices:
-            try:
-                likers_button = likers_buttons[i]
-                link = likers_button.get_attribute("href")
-                if "likers" in link:
-                    links.append(link)
-                    if added < 20:
-                        added = self.add_likers_of_page(link, added=added)
-                        self.friended += added
-                        sleep(1)
-                        self.browser.execute_script("window.history.go(-1)")
-                        sleep(1)
-                        likers_buttons = self.refresh_links()
-                    else:
-                        self.logger.error("Enough adding for now")
-                        break
-            except Exception as e:
-                self.logger.error(e)
+            # read the links of the results at once, the likers pages are
+            # then visited by their URL instead of going back to the results
+            links = []
+            for likers_button in self.refresh_links():
+                try:
+                    link = likers_button.get_attribute("href")
+                    if link and "likers" in link and link not in links:
+                        links.append(link)
+                except Exception as e:
+                    self.logger.error(e)
+            random.shuffle(links)
+            self.logger.info(
+                "Will explore pages in following order: {}".format(links)
+            )
+
+            for link in links:
+                if queued >= max_add:
+                    self.logger.info("Enough likers queued for now")
+                    break
+                try:
+                    self.harvest_page_likers(link, queue, source, max_add, delay_random)
+                    queued = queue.pending(source)
+                except Exception as e:
+                    self.logger.error(e)
+
+        if not harvest_only:
+            added = self.add_queued_friends(
+                queue, source, max_add=max_add, sleep_delay=sleep_delay
+            )
+            self.friended += added
         self.logger.info("===End of add_likers_from_term")
 
-    def process_rows_and_add_by_visiting(
-        self, rows, added=0, max_add=50, sleep_delay=6
-    ):
-        delay_random = random.randint(
-            ceil(sleep_delay * 0.85), ceil(sleep_delay * 1.14)
-        )
-        self.logger.info("process_rows_and_add_by_visiting:")
+    def harvest_friend_rows(self, rows, queue, source, max_add=50):
+        """Queues the users of the rows which can be added as friends"""
+        self.logger.info("harvest_friend_rows:")
         pending = 0
         useful_userids = []
         useless_ids = 0
         failed_parsing = 0
-        for row in rows:
-            try:
-                btn = row.find_element_by_css_selector(
-                    "div.FriendButton > button.FriendRequestAdd.addButton"
-                )
+        # parse all the rows at once; only adding them is paced
+        for record in parse_friend_rows(self.browser, rows):
+            if record["button"] is None or record["href"] is None:
+                failed_parsing += 1
 
-                before_text = btn.text.strip()
-                if before_text != "Add Friend":
-                    pending += 1
-                    continue
+            elif record["button"] != "Add Friend" or record["hidden"]:
+                pending += 1
 
-                if "hidden_elem" in btn.get_attribute("class"):
-                    pending += 1
-                    continue
+            elif record["username"] is None:
+                useless_ids += 1
 
-                prof_link = row.find_element_by_css_selector("a")
-                userid = prof_link.get_attribute("href").split("?")[0].split("/")[3]
-                if userid == "profile.php":
-                    useless_ids += 1
-                    continue
-                useful_userids.append(userid)
-                sleep(delay_random)
-            except Exception as e:
-                failed_parsing += 1
-                self.logger.error(e)
-            self.logger.info(
-                " pending:{} === failed_parsing:{} === useless_ids:{} === collected for adding:{} ".format(
-                    pending, failed_parsing, useless_ids, len(useful_userids)
-                )
+            else:
+                useful_userids.append(record["username"])
+
+        # leave out the users harvested by any feature before
+        seen = get_seen_index(Settings, "friend")
+        useful_userids = filter_seen(seen, useful_userids, self.logger)
+        if len(useful_userids) > max_add:
+            self.logger.info("Too many users for now, let's process")
+            useful_userids = useful_userids[:max_add]
+
+        queued = queue.enqueue(source, useful_userids)
+        record_seen(seen, useful_userids)
+        self.logger.info(
+            " pending:{} === failed_parsing:{} === useless_ids:{} === collected for adding:{} === newly queued:{} ".format(
+                pending, failed_parsing, useless_ids, len(useful_userids), queued
             )
-            if len(useful_userids) >= max_add:
-                self.logger.info("Too many users for now, let's process")
-                break
+        )
+        if pending > 0:
+            self.logger.info("{} pending(or already friend) sent outs".format(pending))
+
+        return queued
+
+    def queue_harvested(
+        self, candidates, queue, source, wanted, seen, skip_followed=False
+    ):
+        """Queues the candidates streamed by the generator until `wanted` of
+        them are newly queued; the rest are never pulled, so the page is not
+        scrolled for them"""
+        queued = 0
+        with closing(candidates):
+            while queued < wanted:
+                # pull only as many as are still missing, then filter them at once
+                chunk = list(islice(candidates, wanted - queued))
+                if not chunk:
+                    break
+
+                if skip_followed:
+                    # leave out the already followed users before queueing any
+                    chunk = filter_follow_restricted(
+                        chunk, self.follow_times, self.logger
+                    )
+                # and the users harvested by any feature before
+                chunk = filter_seen(seen, chunk, self.logger)
+                # This way of iterating will prevent sleep interference
+                # between functions
+                random.shuffle(chunk)
+                queued += queue.enqueue(source, chunk)
+                record_seen(seen, chunk)
+
+        return queued
+
+    def add_queued_friends(self, queue, source, added=0, max_add=50, sleep_delay=6):
+        """Adds the queued users of the source as friends, until `max_add`
+        are added in total"""
+        delay_random = random.randint(
+            ceil(sleep_delay * 0.85), ceil(sleep_delay * 1.14)
+        )
+        userids = queue.claim(source, max(max_add - added, 0))
+        seen = get_seen_index(Settings, "friend")
+
+        # `friend_user()` skips the users friended once, so leave them out
+        # before visiting any
+        eligible = filter_friend_restricted(userids, 1, self.logger)
+        queue.finish(source, set(userids) - set(eligible), SKIPPED)
+        record_seen(seen, set(userids) - set(eligible), SKIPPED)
 
         failed_adding = 0
-        for userid in useful_userids:
-            try:
-                friend_state, msg = friend_user(
-                    self.browser,
-                    "profile",
-                    self.username,
-                    userid,
-                    self.friend_times,
-                    self.blacklist,
-                    self.logger,
-                    self.logfolder,
-                )
-                if friend_state:
-                    added += 1
-                else:
+        handled = []
+        try:
+            for userid in eligible:
+                try:
+                    friend_state, msg = friend_user(
+                        self.browser,
+                        "profile",
+                        self.username,
+                        userid,
+                        self.friend_times,
+                        self.blacklist,
+                        self.logger,
+                        self.logfolder,
+                    )
+                    if friend_state:
+                        added += 1
+                        outcome = DONE
+                    else:
+                        failed_adding += 1
+                        outcome = SKIPPED
+                except Exception as e:
                     failed_adding += 1
-            except Exception as e:
-                failed_adding += 1
-                self.logger.error(userid, e)
+                    outcome = FAILED
+                    self.logger.error(userid, e)
+                queue.finish(source, userid, outcome)
+                record_seen(seen, userid, outcome)
+                handled.append(userid)
+                # pace the requests as the parsing of the rows used to
                 sleep(delay_random)
-            self.logger.info(
-                " pending:{} === failed_adding(or already friend):{} === useless_ids:{} === added:{}/{} ".format(
-                    pending, failed_adding, useless_ids, added, len(useful_userids)
+                self.logger.info(
+                    " failed_adding(or already friend):{} === added:{}/{} ".format(
+                        failed_adding, added, len(eligible)
+                    )
                 )
-            )
-
-        if pending > 0:
-            self.logger.info("{} pending(or already friend) sent outs".format(pending))
+        finally:
+            # the users left by an error stay in line
+            queue.finish(source, set(eligible) - set(handled), PENDING)
 
         self.logger.info("Total friends added so far: {}".format(added))
+        return added
 
-    def add_members_of_group(self, group_id, added=0, max_add=50, sleep_delay=6):
+    @timed_feature
+    def add_members_of_group(
+        self, group_id, added=0, max_add=50, sleep_delay=6, harvest_only=False
+    ):
         self.logger.info("====About to add_members_of_group: {}".format(group_id))
         delay_random = random.randint(
             ceil(sleep_delay * 0.85), ceil(sleep_delay * 1.14)
         )
-        group_members_url = "https://www.facebook.com/groups/{}/members_with_things_in_common/".format(
-            group_id
-        )
-        self.browser.get(group_members_url)
-        self.logger.info("Visiting to add members of group: {}".format(group_id))
+        queue = get_work_queue(Settings)
+        source = "group:{}".format(group_id)
 
-        for i in range(20):
-            self.browser.execute_script(
-                "window.scrollTo(0, document.body.scrollHeight);"
+        # members queued by an earlier run are added before harvesting more
+        queued = queue.pending(source)
+        if queued >= max_add - added:
+            self.logger.info(
+                "Resuming with {} queued members of group: {}".format(queued, group_id)
+            )
+        else:
+            group_members_url = "https://www.facebook.com/groups/{}/members_with_things_in_common/".format(
+                group_id
             )
-            sleep(delay_random)
+            self.browser.get(group_members_url)
+            self.logger.info("Visiting to add members of group: {}".format(group_id))
 
-        selector = "div[id^='things_in_common_']"
-        rows = self.browser.find_elements_by_css_selector(selector)
-        self.logger.info("Total rows found {}".format(len(rows)))
-        added = self.process_rows_and_add_by_visiting(
-            rows=rows, added=added, max_add=max_add, sleep_delay=sleep_delay
-        )
+            selector = "div[id^='things_in_common_']"
+            # many rows are left out as pending or already friended
+            scroll_until_stable(
+                self.browser,
+                selector,
+                target_count=max_add * ROWS_PER_ADD,
+                idle_timeout=delay_random,
+            )
+
+            rows = self.browser.find_elements_by_css_selector(selector)
+            self.logger.info("Total rows found {}".format(len(rows)))
+            self.harvest_friend_rows(rows, queue, source, max_add)
+
+        if not harvest_only:
+            added = self.add_queued_friends(
+                queue, source, added=added, max_add=max_add, sleep_delay=sleep_delay
+            )
         self.logger.info("====End of add_members_of_group===")
         return added
 
-    def add_likers_of_page(self, page_likers_url, added=0, max_add=50, sleep_delay=6):
-        self.logger.info("====About to add_likers_of_page: {}".format(page_likers_url))
-        delay_random = random.randint(
-            ceil(sleep_delay * 0.85), ceil(sleep_delay * 1.14)
-        )
+    def harvest_page_likers(
+        self, page_likers_url, queue, source, max_add=50, idle_timeout=6
+    ):
+        """Queues the likers of the page which can be added as friends"""
         self.browser.get(page_likers_url)
         self.logger.info("Visiting to add likers of page: {}".format(page_likers_url))
 
-        for i in range(20):
-            self.browser.execute_script(
-                "window.scrollTo(0, document.body.scrollHeight);"
-            )
-            sleep(delay_random)
-
         selector = "div[data-testid*=results] > div"
+        scroll_until_stable(
+            self.browser,
+            selector,
+            target_count=max_add * ROWS_PER_ADD,
+            idle_timeout=idle_timeout,
+        )
+
         rows = self.browser.find_elements_by_css_selector(selector)
         self.logger.info("Total rows found {}".format(len(rows)))
-        added = self.process_rows_and_add_by_visiting(
-            rows=rows, added=added, max_add=max_add, sleep_delay=sleep_delay
+        return self.harvest_friend_rows(rows, queue, source, max_add)
+
+    @timed_feature
+    def add_likers_of_page(self, page_likers_url, added=0, max_add=50, sleep_delay=6):
+        self.logger.info("====About to add_likers_of_page: {}".format(page_likers_url))
+        delay_random = random.randint(
+            ceil(sleep_delay * 0.85), ceil(sleep_delay * 1.14)
+        )
+        queue = get_work_queue(Settings)
+        source = "page:{}".format(page_likers_url)
+
+        self.harvest_page_likers(page_likers_url, queue, source, max_add, delay_random)
+        added = self.add_queued_friends(
+            queue, source, added=added, max_add=max_add, sleep_delay=sleep_delay
         )
         self.logger.info("====End of add_likers_of_page===")
         return added
@@ -1377,15 +1663,20 @@ class FacebookPy:
 
     def try_invite_with(self, name):
         try:
-            invite_to_page_button = self.browser.find_element_by_xpath(
-                "//*[contains(text(), 'Invite ')]"
+            # the menu is open already, don't wait `page_delay` for a miss
+            invite_to_page_button = probe_one(
+                self.browser, "//*[contains(text(), 'Invite ')]", timeout=PROBE_TIMEOUT
             )  # + name + " to like your Pages')]")
+            if invite_to_page_button is None:
+                self.logger.info("No invite option for {}".format(name))
+                return False
             invite_to_page_button.click()
             return True
         except Exception as e:
             self.logger.error(e)
             return False
 
+    @timed_feature
     def invite_friends_to_page(self, friendslist, pagename, sleep_delay=6):
         self.logger.info("====Start invite_friends_to_page===")
         delay_random = random.randint(
@@ -1482,6 +1773,7 @@ class FacebookPy:
         self.logger.info("====End of invite_friends_to_page===")
         return net_invited_friends
 
+    @timed_feature
     def interact_by_users(self, usernames, amount=10, randomize=False, media=None):
         """Likes some amounts of images for each usernames"""
         if self.aborting:
@@ -1753,6 +2045,7 @@ class FacebookPy:
                     self.blacklist,
                     self.logger,
                     self.logfolder,
+                    Settings,
                 )
                 if follow_state is True:
                     followed += 1
@@ -1799,8 +2092,15 @@ class FacebookPy:
 
         return self
 
+    @timed_feature
     def follow_user_followers(
-        self, usernames, amount=10, randomize=False, interact=False, sleep_delay=600
+        self,
+        usernames,
+        amount=10,
+        randomize=False,
+        interact=False,
+        sleep_delay=600,
+        harvest_only=False,
     ):
         """ Follow the `Followers` of given users """
         if self.aborting:
@@ -1829,6 +2129,8 @@ class FacebookPy:
         inap_img_init = self.inap_img
 
         self.quotient_breach = False
+        queue = get_work_queue(Settings)
+        seen = get_seen_index(Settings, "follow")
 
         for index, user in enumerate(usernames):
             if self.quotient_breach:
@@ -1838,123 +2140,156 @@ class FacebookPy:
                 "User '{}' [{}/{}]".format((user), index + 1, len(usernames))
             )
 
-            try:
-                person_list, simulated_list = get_given_user_followers(
-                    self.browser,
-                    self.username,
-                    self.userid,
-                    user,
-                    amount,
-                    self.dont_include,
-                    randomize,
-                    self.blacklist,
-                    self.follow_times,
-                    self.simulation,
-                    self.jumps,
-                    self.logger,
-                    self.logfolder,
+            source = "followers:{}".format(user)
+            simulated_list = []
+
+            # followers queued by an earlier run are followed before grabbing
+            # more of them
+            queued = queue.pending(source)
+            if queued >= amount:
+                self.logger.info(
+                    "Resuming with {} queued followers of '{}'".format(queued, user)
                 )
 
-            except (TypeError, RuntimeWarning) as err:
-                if isinstance(err, RuntimeWarning):
-                    self.logger.warning(
-                        "Warning: {} , skipping to next user".format(err)
+            else:
+                try:
+                    # the followers list is scrolled only until enough of them
+                    # are queued
+                    self.queue_harvested(
+                        iter_given_user_followers(
+                            self.browser, self.userid, user, self.logger
+                        ),
+                        queue,
+                        source,
+                        amount - queued,
+                        seen,
                     )
-                    continue
 
-                else:
-                    self.logger.error("Sorry, an error occurred: {}".format(err))
-                    self.aborting = True
-                    return self
+                except (TypeError, RuntimeWarning) as err:
+                    if isinstance(err, RuntimeWarning):
+                        self.logger.warning(
+                            "Warning: {} , skipping to next user".format(err)
+                        )
+                        continue
+
+                    else:
+                        self.logger.error("Sorry, an error occurred: {}".format(err))
+                        self.aborting = True
+                        return self
+
+            if harvest_only:
+                continue
+
+            claimed = queue.claim(source, amount)
+            # leave out the already followed users before visiting any
+            person_list = filter_follow_restricted(
+                claimed, self.follow_times, self.logger
+            )
+            queue.finish(source, set(claimed) - set(person_list), SKIPPED)
+            record_seen(seen, set(claimed) - set(person_list), SKIPPED)
 
             self.logger.info(
                 "Grabbed {} usernames from '{}'s `Followers` to do following\n".format(
                     len(person_list), user
                 )
             )
+            handled = []
 
             followed_personal = 0
             simulated_unfollow = 0
 
-            for index, person in enumerate(person_list):
-                if self.quotient_breach:
-                    self.logger.warning(
-                        "--> Follow quotient reached its peak!"
-                        "\t~leaving Follow-User-Followers activity\n"
-                    )
-                    break
+            try:
+                for index, person in enumerate(person_list):
+                    if self.quotient_breach:
+                        self.logger.warning(
+                            "--> Follow quotient reached its peak!"
+                            "\t~leaving Follow-User-Followers activity\n"
+                        )
+                        break
 
-                self.logger.info(
-                    "Ongoing Follow [{}/{}]: now following '{}'...".format(
-                        index + 1, len(person_list), person
+                    self.logger.info(
+                        "Ongoing Follow [{}/{}]: now following '{}'...".format(
+                            index + 1, len(person_list), person
+                        )
                     )
-                )
 
-                validation, details = self.validate_user_call(person)
-                if validation is not True:
-                    self.logger.info(details)
-                    not_valid_users += 1
+                    validation, details = self.validate_user_call(person)
+                    if validation is not True:
+                        self.logger.info(details)
+                        not_valid_users += 1
 
-                    if person in simulated_list:
-                        self.logger.warning(
-                            "--> Simulated Unfollow {}: unfollowing"
-                            " '{}' due to mismatching validation...\n".format(
-                                simulated_unfollow + 1, person
+                        if person in simulated_list:
+                            self.logger.warning(
+                                "--> Simulated Unfollow {}: unfollowing"
+                                " '{}' due to mismatching validation...\n".format(
+                                    simulated_unfollow + 1, person
+                                )
                             )
-                        )
 
-                        unfollow_state, msg = unfollow_user(
-                            self.browser,
-                            "profile",
-                            self.username,
-                            person,
-                            None,
-                            None,
-                            self.relationship_data,
-                            self.logger,
-                            self.logfolder,
-                        )
-                        if unfollow_state is True:
-                            simulated_unfollow += 1
-                    # skip this [non-validated] user
-                    continue
-
-                # go ahead and follow, then interact (if any)
-                with self.feature_in_feature("follow_by_list", False):
-                    followed = self.follow_by_list(
-                        person, self.follow_times, sleep_delay, interact
-                    )
-                sleep(1)
+                            unfollow_state, msg = unfollow_user(
+                                self.browser,
+                                "profile",
+                                self.username,
+                                person,
+                                None,
+                                None,
+                                self.relationship_data,
+                                self.logger,
+                                self.logfolder,
+                            )
+                            if unfollow_state is True:
+                                simulated_unfollow += 1
+                        # skip this [non-validated] user
+                        queue.finish(source, person, SKIPPED)
+                        record_seen(seen, person, SKIPPED)
+                        handled.append(person)
+                        continue
 
-                if followed > 0:
-                    followed_all += 1
-                    followed_new += 1
-                    followed_personal += 1
+                    # go ahead and follow, then interact (if any)
+                    with self.feature_in_feature("follow_by_list", False):
+                        followed = self.follow_by_list(
+                            person, self.follow_times, sleep_delay, interact
+                        )
+                    sleep(1)
+                    outcome = DONE if followed > 0 else SKIPPED
+                    queue.finish(source, person, outcome)
+                    record_seen(seen, person, outcome)
+                    handled.append(person)
 
-                self.logger.info(
-                    "Follow per user: {}  |  Total Follow: {}\n".format(
-                        followed_personal, followed_all
-                    )
-                )
+                    if followed > 0:
+                        followed_all += 1
+                        followed_new += 1
+                        followed_personal += 1
 
-                # take a break after a good following
-                if followed_new >= relax_point:
-                    delay_random = random.randint(
-                        ceil(sleep_delay * 0.85), ceil(sleep_delay * 1.14)
-                    )
-                    sleep_time = (
-                        "{} seconds".format(delay_random)
-                        if delay_random < 60
-                        else "{} minutes".format(truncate_float(delay_random / 60, 2))
-                    )
                     self.logger.info(
-                        "------=>  Followed {} new users ~sleeping about {}\n".format(
-                            followed_new, sleep_time
+                        "Follow per user: {}  |  Total Follow: {}\n".format(
+                            followed_personal, followed_all
                         )
                     )
-                    sleep(delay_random)
-                    relax_point = random.randint(7, 14)
-                    followed_new = 0
+
+                    # take a break after a good following
+                    if followed_new >= relax_point:
+                        delay_random = random.randint(
+                            ceil(sleep_delay * 0.85), ceil(sleep_delay * 1.14)
+                        )
+                        sleep_time = (
+                            "{} seconds".format(delay_random)
+                            if delay_random < 60
+                            else "{} minutes".format(
+                                truncate_float(delay_random / 60, 2)
+                            )
+                        )
+                        self.logger.info(
+                            "------=>  Followed {} new users ~sleeping about {}\n".format(
+                                followed_new, sleep_time
+                            )
+                        )
+                        sleep(delay_random)
+                        relax_point = random.randint(7, 14)
+                        followed_new = 0
+            finally:
+                # the followers left by a quotient breach or an error stay in line
+                queue.finish(source, set(person_list) - set(handled), PENDING)
 
         # final words
         self.logger.info(
@@ -1994,20 +2329,59 @@ class FacebookPy:
             if self.nogui:
                 self.display.stop()
 
+            # commit the queued DB writes before reading the DB back
+            stop_write_behind()
+
             # write useful information
             dump_follow_restriction(self.username, self.logger, self.logfolder)
 
+            if Settings.activity_retention_days:
+                address, id = get_database(Settings)
+                prune_activity(
+                    address, id, Settings.activity_retention_days, self.logger
+                )
+
+            if Settings.candidate_queue_retention_days:
+                address, id = get_database(Settings)
+                prune_candidate_queue(
+                    address, id, Settings.candidate_queue_retention_days, self.logger
+                )
+
+            # release the DB connections shared throughout the session
+            clear_restriction_caches()
+            clear_profile_caches()
+            save_seen_indexes()
+            close_connections()
+
             with open("{}followed.txt".format(self.logfolder), "w") as followFile:
                 followFile.write(str(self.followed))
 
             # output live stats before leaving
             self.live_report()
+            clear_feature_times()
+
+            if self.command_profiler is not None:
+                self.report_commands()
 
             message = "Session ended!"
             highlight_print(
                 Settings, self.username, message, "end", "info", self.logger
             )
 
+    def report_commands(self):
+        """ Report the WebDriver commands sent by each feature """
+        self.logger.info(
+            "WebDriver commands per feature:\n\t{}".format(
+                "\n\t".join(self.command_profiler.report())
+            )
+        )
+
+        if self.profile_commands_path:
+            self.command_profiler.dump(self.profile_commands_path)
+            self.logger.info(
+                "Saved the command profile to {}".format(self.profile_commands_path)
+            )
+
     @contextmanager
     def feature_in_feature(self, feature, validate_users):
         """
@@ -2104,6 +2478,29 @@ class FacebookPy:
                 "\n{}\n{}".format(owner_relationship_info, run_time_msg)
             )
 
+        if self.profile_cache_hits or self.profile_cache_misses:
+            self.logger.info(
+                "Profile cache: {} hits, {} misses".format(
+                    self.profile_cache_hits, self.profile_cache_misses
+                )
+            )
+
+        state = getattr(self.browser, "page_state", None)
+        if state is not None and (state.loads or state.reuses):
+            self.logger.info(
+                "Page loads: {}, reused loaded pages: {}".format(
+                    state.loads, state.reuses
+                )
+            )
+
+        time_report = feature_time_report()
+        if time_report:
+            self.logger.info(
+                "Wait & work time per feature:\n\t|> {}".format(
+                    "\n\t|> ".join(time_report)
+                )
+            )
+
     def is_mandatory_character(self, uchr):
         if self.aborting:
             return self
@@ -2161,4 +2558,6 @@ def smart_run(session):
             raise
 
     finally:
+        # keep the queued DB writes even if ending the session fails
+        flush_write_behind()
         session.end()
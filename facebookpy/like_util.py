@@ -2,7 +2,7 @@
 import random
 import re
 
-from socialcommons.time_util import sleep
+from .clock import sleep
 from socialcommons.util import format_number
 from socialcommons.util import add_user_to_blacklist
 from socialcommons.util import click_element
@@ -13,6 +13,11 @@ from socialcommons.util import get_number_of_posts
 from socialcommons.util import get_action_delay
 from socialcommons.quota_supervisor import quota_supervisor
 from .unfollow_util import get_following_status
+from .browser_util import probe
+from .browser_util import PROBE_TIMEOUT
+from .browser_util import extract_new_links
+from .browser_util import LinkCollector
+from .browser_util import visit_page
 from .settings import Settings
 
 from selenium.common.exceptions import WebDriverException
@@ -32,15 +37,38 @@ def get_links_for_username(
 ):
     """Fetches the number of links specified
     by amount and returns a list of links"""
+    state = open_links_profile(
+        browser, username, person, logger, logfolder, media, taggedImages
+    )
+    if state is None:
+        return False
+
+    links = list(iter_profile_links(browser, state, person, amount, logger))
+    if randomize is True:
+        random.shuffle(links)
+
+    return links
+
+
+def media_texts(media):
+    """ The texts of the post anchors of the given media type """
     if media is None:
         # All known media types
-        media = ["", "Post", "Video"]
+        return ["", "Post", "Video"]
     elif media == "Photo":
         # Include posts with multiple images in it
-        media = ["", "Post"]
+        return ["", "Post"]
     else:
         # Make it an array to use it in the following part
-        media = [media]
+        return [media]
+
+
+def open_links_profile(
+    browser, username, person, logger, logfolder, media=None, taggedImages=False
+):
+    """Loads the profile of the user to read post links from and returns its
+    page state, or None if its posts can't be read"""
+    media = media_texts(media)
 
     logger.info("Getting {} image list...".format(person))
 
@@ -48,15 +76,15 @@ def get_links_for_username(
     if taggedImages:
         user_link = user_link + "tagged/"
 
-    # Check URL of the webpage, if it already is user's profile page,
-    # then do not navigate to it again
-    web_address_navigator(browser, user_link, logger, Settings)
+    # do not navigate to the user's profile page again if it's loaded
+    # already, e.g. by the validation of the user
+    state = visit_page(browser, user_link, logger, Settings)
 
     if "Page Not Found" in browser.title:
         logger.error(
             "Facebook error: The link you followed may be broken, or the page may have been removed..."
         )
-        return False
+        return None
 
     # if private user, we can get links only if we following
     following, follow_button = get_following_status(
@@ -70,12 +98,28 @@ def get_links_for_username(
         or (is_private is True and not following)
         or (following == "Blocked")
     ):
-        return False
+        return None
 
-    # Get links
-    links = []
+    # Get links, on top of those read from this page already
+    collected = state.get("links")
+    if collected is not None and collected[0] != media:
+        # the anchors read for other media are marked as seen, start over
+        browser.refresh()
+        state = visit_page(browser, user_link, logger, Settings)
+        collected = None
+    state.remember("links", (media, collected[1] if collected else LinkCollector()))
+
+    return state
+
+
+def iter_profile_links(browser, state, person, amount, logger):
+    """Yields up to `amount` post links of the profile loaded by
+    `open_links_profile()`, scrolling for more only when asked for"""
+    media, collector = state.get("links")
     main_elem = browser.find_element_by_tag_name("article")
-    posts_count = get_number_of_posts(browser)
+    if "posts_count" not in state.facts:
+        state.remember("posts_count", get_number_of_posts(browser))
+    posts_count = state.get("posts_count")
     attempt = 0
 
     if posts_count is not None and amount > posts_count:
@@ -85,19 +129,22 @@ def get_links_for_username(
         )
         amount = posts_count
 
-    while len(links) < amount:
-        initial_links = links
+    # the links read from this page before come first
+    yielded = 0
+    for link in collector.links[:amount]:
+        yield link
+        yielded += 1
+
+    while yielded < amount:
         browser.execute_script("window.scrollTo(0, document.body.scrollHeight);")
         # update server calls after a scroll request
         update_activity(Settings)
         sleep(0.66)
 
-        # using `extend`  or `+=` results reference stay alive which affects
-        # previous assignment (can use `copy()` for it)
-        links = links + get_links(browser, person, logger, media, main_elem)
-        links = sorted(set(links), key=links.index)
+        # only the anchors loaded by this scroll are read
+        added = collector.add(extract_new_links(browser, main_elem, media))
 
-        if len(links) == len(initial_links):
+        if not added:
             if attempt >= 7:
                 logger.info(
                     "There are possibly less posts than {} in {}'s profile "
@@ -108,11 +155,9 @@ def get_links_for_username(
                 attempt += 1
         else:
             attempt = 0
-
-    if randomize is True:
-        random.shuffle(links)
-
-    return links[:amount]
+            for link in collector.links[-added:][: amount - yielded]:
+                yield link
+                yielded += 1
 
 
 def get_media_edge_comment_string(media):
@@ -344,15 +389,16 @@ def like_image(browser, username, blacklist, logger, logfolder, Settings):
     like_xpath = "//section/span/button/span[@aria-label='Like']"
     unlike_xpath = "//section/span/button/span[@aria-label='Unlike']"
 
-    # find first for like element
-    like_elem = browser.find_elements_by_xpath(like_xpath)
+    # find first for like element; an already liked post has none, so
+    # don't wait the whole `page_delay` for it
+    like_elem = probe(browser, like_xpath, timeout=PROBE_TIMEOUT)
 
     if len(like_elem) == 1:
         # sleep real quick right before clicking the element
         sleep(2)
         click_element(browser, Settings, like_elem[0])
         # check now we have unlike instead of like
-        liked_elem = browser.find_elements_by_xpath(unlike_xpath)
+        liked_elem = probe(browser, unlike_xpath, timeout=PROBE_TIMEOUT)
 
         if len(liked_elem) == 1:
             logger.info("--> Image Liked!")
@@ -375,7 +421,7 @@ def like_image(browser, username, blacklist, logger, logfolder, Settings):
             sleep(120)
 
     else:
-        liked_elem = browser.find_elements_by_xpath(unlike_xpath)
+        liked_elem = probe(browser, unlike_xpath)
         if len(liked_elem) == 1:
             logger.info("--> Image already liked!")
             return False, "already liked"
@@ -1,10 +1,9 @@
 """Module only used for the login part of the script"""
 # import built-in & third-party modules
-import time
 import pickle
 from selenium.webdriver.common.action_chains import ActionChains
 
-from socialcommons.time_util import sleep
+from .clock import sleep
 from socialcommons.util import update_activity
 from socialcommons.util import web_address_navigator
 from socialcommons.util import reload_webpage
@@ -168,8 +167,8 @@ def login_user(
     except (WebDriverException, OSError, IOError):
         logger.info("Cookie file not found, creating cookie...")
 
-    # include time.sleep(1) to prevent getting stuck on google.com
-    time.sleep(1)
+    # include sleep(1) to prevent getting stuck on google.com
+    sleep(1)
 
     # changes facebook website language to english to use english xpaths
     if switch_language:
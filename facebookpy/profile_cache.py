@@ -0,0 +1,128 @@
+""" Module which reuses the validations of users for a while """
+from datetime import datetime
+from datetime import timedelta
+import hashlib
+import json
+
+from .database_engine import get_database
+from .database_engine import get_connection
+from .database_engine import SELECT_PROFILE_METADATA
+from .database_engine import UPSERT_PROFILE_METADATA
+from .write_behind import execute_write
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def serializable(value):
+    return sorted(value) if isinstance(value, (set, frozenset)) else repr(value)
+
+
+def bounds_key(bounds):
+    """ Digest the bounds a user was validated against; a validation holds
+    only as long as they stay the same """
+    serialized = json.dumps(bounds, sort_keys=True, default=serializable)
+    return hashlib.sha1(serialized.encode("utf-8")).hexdigest()
+
+
+class ProfileCache:
+    """
+    Answer the validation of a user from the `profileMetadata` table as long
+    as it was made less than `ttl` hours ago, with the same bounds.
+
+    A failed validation may come of a page which didn't load, so it is only
+    reused for `negative_ttl` hours, if shorter.
+
+    The validations stored in this session are also kept in memory, so they
+    are found even while their write is still queued behind.
+    """
+
+    def __init__(self, address, profile_id, ttl, negative_ttl=1):
+        self.address = address
+        self.profile_id = profile_id
+        self.ttl = ttl
+        self.negative_ttl = min(ttl, negative_ttl)
+        self.ttls = ttl, negative_ttl
+        # {userid: (bounds, validation, details, checked_at)}
+        self.stored = {}
+
+    def lookup(self, userid, bounds):
+        """ Return the (validation, details) still valid for the user, or
+        None if it has to be validated again """
+        bounds = bounds_key(bounds)
+        cutoff = checked_since(self.ttl)
+
+        stored = self.stored.get(userid)
+        if stored is not None:
+            if stored[0] == bounds and self.holds(stored[1], stored[3], cutoff):
+                return stored[1], stored[2]
+            return None
+
+        conn = get_connection(self.address)
+        with conn:
+            cur = conn.cursor()
+            cur.execute(
+                SELECT_PROFILE_METADATA, (self.profile_id, userid, bounds, cutoff)
+            )
+            data = cur.fetchone()
+
+        if data is None:
+            return None
+
+        validation = bool(data["validation"])
+        if not self.holds(validation, data["checked_at"], cutoff):
+            return None
+
+        return validation, data["details"]
+
+    def holds(self, validation, checked_at, cutoff):
+        """ Tell if a validation made at `checked_at` can still be reused """
+        if not validation:
+            cutoff = max(cutoff, checked_since(self.negative_ttl))
+        return checked_at >= cutoff
+
+    def store(self, userid, bounds, validation, details):
+        bounds = bounds_key(bounds)
+        checked_at = datetime.now().strftime(TIMESTAMP_FORMAT)
+        details = None if details is None else str(details)
+
+        execute_write(
+            self.address,
+            UPSERT_PROFILE_METADATA,
+            (
+                self.profile_id,
+                userid,
+                bounds,
+                int(bool(validation)),
+                details,
+                checked_at,
+            ),
+        )
+        self.stored[userid] = (bounds, bool(validation), details, checked_at)
+
+
+def checked_since(hours):
+    return (datetime.now() - timedelta(hours=hours)).strftime(TIMESTAMP_FORMAT)
+
+
+# caches of the profiles used in this process, by DB address and profile id
+caches = {}
+
+
+def get_profile_cache(Settings):
+    """ Get the profile cache of the current profile, if enabled """
+    if not Settings.profile_cache_ttl:
+        return None
+
+    address, profile_id = get_database(Settings)
+
+    ttls = Settings.profile_cache_ttl, Settings.profile_cache_negative_ttl
+    cache = caches.get((address, profile_id))
+    if cache is None or cache.ttls != ttls:
+        cache = ProfileCache(address, profile_id, *ttls)
+        caches[(address, profile_id)] = cache
+
+    return cache
+
+
+def clear_profile_caches():
+    caches.clear()
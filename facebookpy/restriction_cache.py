@@ -0,0 +1,158 @@
+""" Module which keeps the restriction history of the profile in memory """
+from collections import OrderedDict
+
+from .database_engine import get_database
+from .database_engine import get_connection
+from .database_engine import RESTRICTION_STATEMENTS
+from .database_engine import select_restriction_times
+from .write_behind import execute_write
+
+
+class RestrictionCache:
+    """
+    Answer restriction reads of a profile from memory.
+
+    All the restriction records of the profile are bulk-loaded once; reads
+    are then served from a dict and writes go through to the DB, or behind
+    it if the write-behind queue is enabled. The
+    number of records kept per table is bounded by `max_entries` in a
+    least-recently-used fashion. As long as a table was loaded completely a
+    missing key means no restriction, otherwise the DB is asked for it.
+    """
+
+    def __init__(self, address, profile_id, max_entries=100000):
+        self.address = address
+        self.profile_id = profile_id
+        self.max_entries = max_entries
+
+        self.entries = {table: OrderedDict() for table in RESTRICTION_STATEMENTS}
+        self.complete = {table: False for table in RESTRICTION_STATEMENTS}
+
+    def preload(self):
+        """ Load the most recent restriction records of the profile """
+        conn = get_connection(self.address)
+
+        with conn:
+            cur = conn.cursor()
+
+            for table, statements in RESTRICTION_STATEMENTS.items():
+                # ask for one more row to find out if all of them fit
+                cur.execute(
+                    statements["select_profile"],
+                    (self.profile_id, self.max_entries + 1),
+                )
+                rows = cur.fetchall()
+
+                entries = self.entries[table]
+                entries.clear()
+                # rows come newest first, the newest must be the last to evict
+                for row in reversed(rows[: self.max_entries]):
+                    row = tuple(row)
+                    entries[row[:-1]] = row[-1]
+
+                self.complete[table] = len(rows) <= self.max_entries
+
+        return self
+
+    def times(self, table, key):
+        """ Get how many times the restriction was recorded for the key """
+        entries = self.entries[table]
+
+        if key in entries:
+            # mark as the most recently used
+            times = entries.pop(key)
+            entries[key] = times
+            return times
+
+        if self.complete[table]:
+            return 0
+
+        conn = get_connection(self.address)
+        with conn:
+            cur = conn.cursor()
+            cur.execute(
+                RESTRICTION_STATEMENTS[table]["select"], (self.profile_id,) + key
+            )
+            data = cur.fetchone()
+
+        times = data["times"] if data else 0
+        self.remember(table, key, times)
+
+        return times
+
+    def eligible(self, table, usernames, limit):
+        """
+        Keep the usernames which are restricted less than `limit` times.
+
+        Only for the tables keyed by username. Usernames not in memory are
+        looked up together, in chunks, rather than one query per username.
+        """
+        entries = self.entries[table]
+        times = {}
+        missing = []
+
+        for username in usernames:
+            key = (username,)
+            if key in entries:
+                times[username] = entries[key]
+
+            elif not self.complete[table]:
+                missing.append(username)
+
+        if missing:
+            found = select_restriction_times(
+                get_connection(self.address), table, self.profile_id, missing
+            )
+            for username in missing:
+                times[username] = found.get(username, 0)
+                self.remember(table, (username,), times[username])
+
+        return [
+            username
+            for username in usernames
+            if not times.get(username) or times[username] < limit
+        ]
+
+    def write(self, table, key):
+        """ Record the restriction for the key once more """
+        # take the current value before the write, which may stay queued
+        times = self.times(table, key)
+
+        execute_write(
+            self.address,
+            RESTRICTION_STATEMENTS[table]["upsert"],
+            (self.profile_id,) + key,
+        )
+        self.remember(table, key, times + 1)
+
+    def remember(self, table, key, times):
+        entries = self.entries[table]
+        entries[key] = times
+
+        if len(entries) > self.max_entries:
+            # forget the least recently used record
+            entries.popitem(last=False)
+            self.complete[table] = False
+
+
+# caches of the profiles used in this process, by DB address and profile id
+caches = {}
+
+
+def get_restriction_cache(Settings):
+    """ Get the restriction cache of the current profile, loading it once """
+    address, profile_id = get_database(Settings)
+
+    cache = caches.get((address, profile_id))
+    if cache is None:
+        cache = RestrictionCache(
+            address, profile_id, Settings.restriction_cache_size
+        ).preload()
+        caches[(address, profile_id)] = cache
+
+    return cache
+
+
+def clear_restriction_caches():
+    """ Drop every loaded restriction cache """
+    caches.clear()
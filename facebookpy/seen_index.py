@@ -0,0 +1,221 @@
+""" Module which remembers the candidates harvested across features """
+from array import array
+from bisect import bisect_left
+import hashlib
+import os
+
+from .work_queue import PENDING
+from .work_queue import DONE
+from .work_queue import SKIPPED
+from .work_queue import FAILED
+
+# the outcomes kept per candidate, by their byte code
+OUTCOMES = [PENDING, DONE, SKIPPED, FAILED]
+
+# 4 bytes per key on the usual platforms, `I` may be narrower elsewhere
+KEY_TYPECODE = "I" if array("I").itemsize >= 4 else "L"
+
+
+def candidate_key(candidate):
+    """ Hash the candidate to the 32-bit key it is kept by """
+    return int(hashlib.sha1(candidate.encode("utf-8")).hexdigest()[:8], 16)
+
+
+class SeenIndex:
+    """
+    Remember the candidates harvested for an action, whichever feature
+    harvested them, with the outcome of acting on them.
+
+    The candidates are kept as 32-bit hashes in a sorted array, next to a
+    byte array of their outcomes: 5 bytes each, so about 5 MB for a million
+    candidates. Two candidates of the same hash make the later one look seen,
+    about once in 4000 look-ups at a million; such a candidate is missed,
+    never acted on twice.
+
+    New candidates wait in a dict until `merge_size` of them are there, then
+    get merged into the arrays in one pass, so that growing the index does
+    not shift the arrays once per candidate.
+
+    The index is loaded from the snapshot at `path` and saved back to it by
+    `save()`, so it survives restarts.
+    """
+
+    def __init__(self, path=None, merge_size=4096):
+        self.path = path
+        self.merge_size = merge_size
+        self.keys = array(KEY_TYPECODE)
+        self.outcomes = bytearray()
+        # {key: outcome code} of the candidates not merged yet
+        self.added = {}
+        self.changed = False
+
+    def __len__(self):
+        return len(self.keys) + len(self.added)
+
+    def load(self):
+        """ Read the snapshot back, if there is a complete one """
+        if not self.path or not os.path.isfile(self.path):
+            return self
+
+        record_size = self.keys.itemsize + 1
+        size = os.path.getsize(self.path)
+        # not a snapshot of this platform's key size
+        if size % record_size:
+            return self
+
+        with open(self.path, "rb") as snapshot:
+            self.keys.fromfile(snapshot, size // record_size)
+            self.outcomes = bytearray(snapshot.read())
+
+        return self
+
+    def save(self):
+        """ Write the snapshot, the keys first and then the outcomes """
+        if not self.path or not self.changed:
+            return
+
+        self.merge()
+
+        # a crash while writing leaves the previous snapshot whole
+        temp_path = "{}.tmp".format(self.path)
+        with open(temp_path, "wb") as snapshot:
+            self.keys.tofile(snapshot)
+            snapshot.write(self.outcomes)
+        # `os.replace()` overwrites atomically on every platform (Python 3)
+        getattr(os, "replace", os.rename)(temp_path, self.path)
+
+        self.changed = False
+
+    def merge(self):
+        """ Merge the new candidates into the sorted arrays in one pass """
+        if not self.added:
+            return
+
+        keys = array(KEY_TYPECODE)
+        outcomes = bytearray()
+        start = 0
+        for key in sorted(self.added):
+            # copy the run of old keys below the new one as a whole
+            index = bisect_left(self.keys, key, start)
+            keys.extend(self.keys[start:index])
+            outcomes.extend(self.outcomes[start:index])
+            keys.append(key)
+            outcomes.append(self.added[key])
+            start = index
+
+        keys.extend(self.keys[start:])
+        outcomes.extend(self.outcomes[start:])
+
+        self.keys, self.outcomes = keys, outcomes
+        self.added.clear()
+
+    def find(self, key):
+        """ Get the position of the key in the arrays, None if not there """
+        index = bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            return index
+
+        return None
+
+    def outcome(self, candidate):
+        """ Get the outcome of the candidate, None if it was never seen """
+        key = candidate_key(candidate)
+        if key in self.added:
+            return OUTCOMES[self.added[key]]
+
+        index = self.find(key)
+        if index is not None:
+            return OUTCOMES[self.outcomes[index]]
+
+        return None
+
+    def unseen(self, candidates):
+        """ Leave out the candidates seen already, but the failed ones; each
+        one is kept once """
+        unseen = []
+        kept = set()
+        for candidate in candidates:
+            if candidate not in kept and self.outcome(candidate) in (None, FAILED):
+                kept.add(candidate)
+                unseen.append(candidate)
+
+        return unseen
+
+    def record(self, candidates, outcome=PENDING):
+        """ Remember the candidates with the outcome; a pending one does not
+        override the outcome of acting on it """
+        if not isinstance(candidates, (list, tuple, set)):
+            candidates = [candidates]
+
+        code = OUTCOMES.index(outcome)
+        for candidate in candidates:
+            key = candidate_key(candidate)
+            index = None if key in self.added else self.find(key)
+
+            if index is not None:
+                if outcome == PENDING or self.outcomes[index] == code:
+                    continue
+                self.outcomes[index] = code
+
+            elif key in self.added:
+                if outcome == PENDING or self.added[key] == code:
+                    continue
+                self.added[key] = code
+
+            else:
+                self.added[key] = code
+
+            self.changed = True
+
+        if len(self.added) >= self.merge_size:
+            self.merge()
+
+
+# indexes of the actions used in this process, by snapshot path
+indexes = {}
+
+
+def get_seen_index(Settings, action):
+    """ Get the seen index of the action, e.g. `follow`, if enabled """
+    if not Settings.seen_index_folder:
+        return None
+
+    path = "{}seen{}Candidates.bin".format(
+        Settings.seen_index_folder, action.capitalize()
+    )
+
+    index = indexes.get(path)
+    if index is None:
+        index = SeenIndex(path).load()
+        indexes[path] = index
+
+    return index
+
+
+def filter_seen(index, candidates, logger):
+    """ Drop the candidates seen already by any feature, before visiting
+    any of them """
+    if index is None:
+        return candidates
+
+    unseen = index.unseen(candidates)
+    if len(unseen) < len(candidates):
+        logger.info(
+            "---> Skipping {} of {} users seen already".format(
+                len(candidates) - len(unseen), len(candidates)
+            )
+        )
+
+    return unseen
+
+
+def record_seen(index, candidates, outcome=PENDING):
+    if index is not None:
+        index.record(candidates, outcome)
+
+
+def save_seen_indexes():
+    """ Save the snapshots of the seen indexes and let them go """
+    for index in indexes.values():
+        index.save()
+    indexes.clear()
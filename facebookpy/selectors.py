@@ -12,3 +12,7 @@ class Selectors:
     """
 
     likes_dialog_body_xpath = '//*[@id="facebook"]/body/div[10]/div[2][@role="dialog"]'
+
+    friend_links_css = (
+        "ul > li > div > div > div.uiProfileBlockContent > div > div:nth-child(2) > div > a"
+    )
@@ -72,5 +72,22 @@ class Settings:
 
     DATABASE_LOCATION = localize_path("FacebookPy", "db", "facebookpy.db")
 
+    # max restriction records per table kept in memory for the profile
+    restriction_cache_size = 100000
+
+    # days of raw activity records to keep, the rollups are kept forever
+    activity_retention_days = None
+
+    # hours a validation of a user is reused for, not at all if None
+    profile_cache_ttl = None
+    # hours a failed validation is reused for, as it may have been transient
+    profile_cache_negative_ttl = 1
+
+    # days the queued candidates acted on are kept, forever if None
+    candidate_queue_retention_days = 30
+
+    # folder of the seen candidates snapshots, no index kept if None
+    seen_index_folder = None
+
     followers_count_xpath = '//a[@name="Followers"]/span[2]'
     following_count_xpath = '//a[@name="Following"]/span[2]'
@@ -3,9 +3,8 @@ from datetime import datetime
 import os
 import random
 import json
-import sqlite3
 
-from socialcommons.time_util import sleep
+from .clock import sleep
 from socialcommons.util import delete_line_from_file
 from socialcommons.util import update_activity
 from socialcommons.util import add_user_to_blacklist
@@ -25,8 +24,16 @@ from socialcommons.print_log_writer import log_followed_pool
 from socialcommons.print_log_writer import log_uncertain_unfollowed_pool
 from socialcommons.print_log_writer import log_record_all_unfollowed
 from socialcommons.print_log_writer import get_log_time
-from socialcommons.database_engine import get_database
 from socialcommons.quota_supervisor import quota_supervisor
+from .database_engine import get_database
+from .database_engine import get_connection
+from .database_engine import SELECT_FOLLOW_RESTRICTIONS_CHANGED_SINCE
+from .database_engine import SELECT_EXPORT_REVISION
+from .database_engine import UPSERT_EXPORT_REVISION
+from .restriction_cache import get_restriction_cache
+from .browser_util import iter_list_hrefs
+from .browser_util import page_state
+from .browser_util import visit_page
 from .settings import Settings
 
 from selenium.common.exceptions import NoSuchElementException
@@ -37,9 +44,12 @@ def get_following_status(
     browser, track, username, person, person_id, logger, logfolder
 ):
     """ Verify if you are following the user in the loaded page """
+    ig_homepage = "https://www.facebook.com/"
     if track == "profile":
-        ig_homepage = "https://www.facebook.com/"
-        web_address_navigator(browser, ig_homepage + person, logger, Settings)
+        state = visit_page(browser, ig_homepage + person, logger, Settings)
+        # read on this very page already
+        if state.get("following_status"):
+            return state.get("following_status")
 
     follow_button_XP = "//div/div/a[@role='button'][text()='Follow']"
     failure_msg = "--> Unable to detect the following status of '{}'!"
@@ -85,6 +95,11 @@ def get_following_status(
     # get follow status
     following_status = follow_button.text
 
+    if track == "profile":
+        page_state(browser).remember(
+            "following_status", (following_status, follow_button)
+        )
+
     return following_status, follow_button
 
 
@@ -112,7 +127,7 @@ def follow_user(
             # check URL of the webpage, if it already is user's profile
             # page, then do not navigate to it again
             user_link = "https://www.facebook.com/{}/".format(userid_to_follow)
-            web_address_navigator(browser, user_link, logger, Settings)
+            visit_page(browser, user_link, logger, Settings)
 
         # find out CURRENT following status
         following_status, follow_button = get_following_status(
@@ -120,6 +135,7 @@ def follow_user(
         )
         if following_status in ["Follow", "Follow Back"]:
             click_visibly(browser, Settings, follow_button)  # click to follow
+            page_state(browser).forget("following_status")
             follow_state, msg = verify_action(
                 browser,
                 "follow",
@@ -237,13 +253,60 @@ def get_given_user_followers(
     :param logfolder: the logger folder
     :return: list of user's followers also followed
     """
+    if not open_user_followers(browser, user_name, userid, logger, amount):
+        return [], []
+
+    # sample among the followers rendered on the first load
+    followers_list = list(iter_user_followers(browser, logger, max_scrolls=0))
+    logger.info(followers_list)
+
+    # TODO: Fix it: Add simulated
+    simulated_list = []
+    if amount < len(followers_list):
+        person_list = random.sample(followers_list, amount)
+    else:
+        person_list = followers_list
+
+    return person_list, simulated_list
+
+
+def iter_given_user_followers(
+    browser, user_name, userid, logger, amount=None, max_scrolls=20
+):
+    """
+    Yield the followers of the given user as their list loads, each once.
+
+    The list is scrolled for more followers only when more are asked for,
+    and no further than `amount` of them if given, so stopping the
+    iteration, e.g. on a quota, spares the scrolls of the rest.
+
+    :param browser: webdriver instance
+    :param user_name: given username of account to follow
+    :param userid: the id of the account in its profile link
+    :param logger: the logger instance
+    :param amount: the most followers to yield
+    :param max_scrolls: the most scrolls of the followers list
+    """
+    if amount is not None and amount <= 0:
+        return
+
+    if not open_user_followers(browser, user_name, userid, logger, amount):
+        return
+
+    for follower in iter_user_followers(browser, logger, amount, max_scrolls):
+        yield follower
+
+
+def open_user_followers(browser, user_name, userid, logger, amount=None):
+    """ Load the followers list of the given user, return False if there are
+    no followers to read """
     user_name = user_name.strip()
 
     user_link = "https://www.facebook.com/{}".format(userid)
     web_address_navigator(browser, user_link, logger, Settings)
 
     if not is_page_available(browser, logger, Settings):
-        return [], []
+        return False
 
     # check how many people are following this user.
     allfollowers, allfollowing = get_relationship_counts(
@@ -253,9 +316,9 @@ def get_given_user_followers(
     # skip early for no followers
     if not allfollowers:
         logger.info("'{}' has no followers".format(user_name))
-        return [], []
+        return False
 
-    elif allfollowers < amount:
+    elif amount is not None and allfollowers < amount:
         logger.warning(
             "'{}' has less followers- {}, than the given amount of {}".format(
                 user_name, allfollowers, amount
@@ -266,81 +329,70 @@ def get_given_user_followers(
     user_followers_link = "https://www.facebook.com/{}/followers".format(userid)
     web_address_navigator(browser, user_followers_link, logger, Settings)
 
+    return True
+
+
+def iter_user_followers(browser, logger, amount=None, max_scrolls=20):
+    """ Yield up to `amount` followers of the list loaded by
+    `open_user_followers()`, scrolling for more only when asked for """
+    followers = set()
     try:
-        followers_links = browser.find_elements_by_xpath(
-            "//div[2]/ul/li/div/div/div[2]/div/div[2]/div/a"
-        )
-        followers_list = []
-        for followers_link in followers_links:
-            splitted = (
-                followers_link.get_attribute("href")
-                .replace("https://www.facebook.com/", "")
-                .split("?")
-            )
+        for href in iter_list_hrefs(
+            browser,
+            "//div[2]/ul/li/div/div/div[2]/div/div[2]/div/a",
+            max_scrolls=max_scrolls,
+        ):
+            splitted = href.replace("https://www.facebook.com/", "").split("?")
             if splitted[0] == "profile.php":
                 u = splitted[0] + "?" + splitted[1]
             else:
                 u = splitted[0]
-            followers_list.append(u)
-        logger.info(followers_list)
 
-        # click_element(browser, Settings, followers_link[0])
-        # # update server calls
-        # update_activity(Settings)
+            if u not in followers:
+                followers.add(u)
+                yield u
 
-    except NoSuchElementException:
-        logger.error("Could not find followers' link for {}".format(user_name))
-        return [], []
+                # done before the list is scrolled for more
+                if amount is not None and len(followers) >= amount:
+                    return
 
-    except BaseException as e:
+    except Exception as e:
         logger.error("`followers_link` error {}".format(str(e)))
-        return [], []
-
-    # channel = "Follow"
-
-    # TODO: Fix it: Add simulated
-    simulated_list = []
-    if amount < len(followers_list):
-        person_list = random.sample(followers_list, amount)
-    else:
-        person_list = followers_list
-
-    return person_list, simulated_list
 
 
 def dump_follow_restriction(profile_name, logger, logfolder):
-    """ Dump follow restriction data to a local human-readable JSON """
+    """ Append the follow restriction records changed since the last dump to
+    a local newline-delimited JSON, one record per line """
 
     try:
-        # get a DB and start a connection
         db, id = get_database(Settings)
-        conn = sqlite3.connect(db)
+        conn = get_connection(db)
+        filename = "{}followRestriction.ndjson".format(logfolder)
 
         with conn:
-            conn.row_factory = sqlite3.Row
             cur = conn.cursor()
 
-            cur.execute(
-                "SELECT * FROM followRestriction WHERE profile_id=:var", {"var": id}
-            )
-            data = cur.fetchall()
-
-        if data:
-            # get the existing data
-            filename = "{}followRestriction.json".format(logfolder)
+            # start over if the export went missing
+            revision = 0
             if os.path.isfile(filename):
-                with open(filename) as followResFile:
-                    current_data = json.load(followResFile)
-            else:
-                current_data = {}
+                cur.execute(SELECT_EXPORT_REVISION, (id, "followRestriction"))
+                data = cur.fetchone()
+                revision = data["revision"] if data else 0
 
-            # pack the new data
-            follow_data = {user_data[1]: user_data[2] for user_data in data or []}
-            current_data[profile_name] = follow_data
+            cur.execute(SELECT_FOLLOW_RESTRICTIONS_CHANGED_SINCE, (revision, id))
 
-            # dump the fresh follow data to a local human readable JSON
-            with open(filename, "w") as followResFile:
-                json.dump(current_data, followResFile)
+            with open(filename, "a") as export:
+                # stream the changed records instead of loading them all
+                for row in cur:
+                    record = {
+                        "profile": profile_name,
+                        "username": row["username"],
+                        "times": row["times"],
+                    }
+                    export.write(json.dumps(record) + "\n")
+                    revision = row["revision"]
+
+            cur.execute(UPSERT_EXPORT_REVISION, (id, "followRestriction", revision))
 
     except Exception as exc:
         logger.error(
@@ -348,10 +400,41 @@ def dump_follow_restriction(profile_name, logger, logfolder):
             "local JSON:\n\t{}".format(str(exc).encode("utf-8"))
         )
 
-    finally:
-        if conn:
-            # close the open connection
-            conn.close()
+
+def compact_follow_restriction(logfolder, logger):
+    """ Rewrite the follow restriction export keeping only the latest record
+    of each followed user """
+
+    filename = "{}followRestriction.ndjson".format(logfolder)
+    if not os.path.isfile(filename):
+        return 0
+
+    try:
+        latest = {}
+        with open(filename) as export:
+            for line in export:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                key = (record["profile"], record["username"])
+                # re-insert so that the record moves to its latest position
+                latest.pop(key, None)
+                latest[key] = line
+
+        temp_filename = "{}.tmp".format(filename)
+        with open(temp_filename, "w") as export:
+            export.writelines(latest.values())
+        # `os.replace()` overwrites atomically on every platform (Python 3)
+        getattr(os, "replace", os.rename)(temp_filename, filename)
+
+        return len(latest)
+
+    except Exception as exc:
+        logger.error(
+            "Pow! Error occurred while compacting follow restriction data of "
+            "the local JSON:\n\t{}".format(str(exc).encode("utf-8"))
+        )
+        return 0
 
 
 def follow_restriction(operation, username, limit, logger):
@@ -359,57 +442,25 @@ def follow_restriction(operation, username, limit, logger):
     the same user """
 
     try:
-        # get a DB and start a connection
-        db, id = get_database(Settings)
-        conn = sqlite3.connect(db)
-
-        with conn:
-            conn.row_factory = sqlite3.Row
-            cur = conn.cursor()
-
-            cur.execute(
-                "SELECT * FROM followRestriction WHERE profile_id=:id_var "
-                "AND username=:name_var",
-                {"id_var": id, "name_var": username},
-            )
-            data = cur.fetchone()
-            follow_data = dict(data) if data else None
-
-            if operation == "write":
-                if follow_data is None:
-                    # write a new record
-                    cur.execute(
-                        "INSERT INTO followRestriction (profile_id, "
-                        "username, times) VALUES (?, ?, ?)",
-                        (id, username, 1),
-                    )
-                else:
-                    # update the existing record
-                    follow_data["times"] += 1
-                    sql = (
-                        "UPDATE followRestriction set times = ? WHERE "
-                        "profile_id=? AND username = ?"
-                    )
-                    cur.execute(sql, (follow_data["times"], id, username))
+        cache = get_restriction_cache(Settings)
 
-                # commit the latest changes
-                conn.commit()
+        if operation == "write":
+            cache.write("followRestriction", (username,))
 
-            elif operation == "read":
-                if follow_data is None:
-                    return False
+        elif operation == "read":
+            times = cache.times("followRestriction", (username,))
 
-                elif follow_data["times"] < limit:
-                    return False
+            if not times or times < limit:
+                return False
 
-                else:
-                    exceed_msg = "" if follow_data["times"] == limit else "more than "
-                    logger.info(
-                        "---> {} has already been followed {}{} times".format(
-                            username, exceed_msg, str(limit)
-                        )
+            else:
+                exceed_msg = "" if times == limit else "more than "
+                logger.info(
+                    "---> {} has already been followed {}{} times".format(
+                        username, exceed_msg, str(limit)
                     )
-                    return True
+                )
+                return True
 
     except Exception as exc:
         logger.error(
@@ -418,9 +469,30 @@ def follow_restriction(operation, username, limit, logger):
             )
         )
 
-    finally:
-        if conn:
-            conn.close()
+
+def filter_follow_restricted(usernames, limit, logger):
+    """ Drop the users which have already been followed `limit` times, with a
+    single look-up for the whole list """
+    try:
+        cache = get_restriction_cache(Settings)
+        eligible = cache.eligible("followRestriction", usernames, limit)
+
+    except Exception as exc:
+        logger.error(
+            "Dap! Error occurred while filtering by follow Restriction:\n\t{}".format(
+                str(exc).encode("utf-8")
+            )
+        )
+        return usernames
+
+    if len(eligible) < len(usernames):
+        logger.info(
+            "---> Skipping {} of {} users already followed {} times".format(
+                len(usernames) - len(eligible), len(usernames), limit
+            )
+        )
+
+    return eligible
 
 
 def unfollow_user(
@@ -447,7 +519,7 @@ def unfollow_user(
         """ Method of unfollowing from a user's profile page or post page """
         if track == "profile":
             user_link = "https://www.facebook.com/{}/".format(person)
-            web_address_navigator(browser, user_link, logger, Settings)
+            visit_page(browser, user_link, logger, Settings)
 
         # find out CURRENT follow status
         following_status, follow_button = get_following_status(
@@ -456,6 +528,7 @@ def unfollow_user(
 
         if following_status in ["Following", "Requested"]:
             click_element(browser, Settings, follow_button)  # click to unfollow
+            page_state(browser).forget("following_status")
             sleep(4)  # TODO: use explicit wait here
             confirm_unfollow(browser)
             unfollow_state, msg = verify_action(
@@ -1,11 +1,10 @@
 from datetime import datetime
-import sqlite3
 
 # import time
 from math import ceil
 import random
 
-from socialcommons.time_util import sleep
+from .clock import sleep
 from socialcommons.util import update_activity
 from socialcommons.util import click_element
 from socialcommons.util import emergency_exit
@@ -18,8 +17,10 @@ from socialcommons.util import reload_webpage
 from socialcommons.util import web_address_navigator
 from socialcommons.util import click_visibly
 from socialcommons.print_log_writer import log_friended_pool
-from socialcommons.database_engine import get_database
 from socialcommons.quota_supervisor import quota_supervisor
+from .browser_util import probe_one
+from .browser_util import PROBE_TIMEOUT
+from .restriction_cache import get_restriction_cache
 from .settings import Settings
 from selenium.common.exceptions import NoSuchElementException
 from selenium.common.exceptions import ElementNotVisibleException
@@ -200,9 +201,11 @@ def unfriend_user(
         ActionChains(browser).click().perform()
         sleep(delay_random)
 
-        unfriend_button = browser.find_element_by_xpath(
-            "//*[contains(text(), 'Unfriend')]"
+        unfriend_button = probe_one(
+            browser, "//*[contains(text(), 'Unfriend')]", timeout=PROBE_TIMEOUT
         )
+        if unfriend_button is None:
+            raise NoSuchElementException("No 'Unfriend' option in the menu")
         unfriend_button.click()
         logger.info(
             "---> {} has been successfully unfriended".format(userid_to_unfriend)
@@ -231,9 +234,11 @@ def unfriend_user_by_url(
         ActionChains(browser).click().perform()
         sleep(delay_random * 2)
 
-        unfriend_button = browser.find_element_by_xpath(
-            "//*[contains(text(), 'Unfriend')]"
+        unfriend_button = probe_one(
+            browser, "//*[contains(text(), 'Unfriend')]", timeout=PROBE_TIMEOUT
         )
+        if unfriend_button is None:
+            raise NoSuchElementException("No 'Unfriend' option in the menu")
         unfriend_button.click()
         logger.info("---> {} has been successfully unfriended".format(url))
         sleep(delay_random)
@@ -248,57 +253,25 @@ def friend_restriction(operation, username, limit, logger):
     the same user """
 
     try:
-        # get a DB and start a connection
-        db, id = get_database(Settings)
-        conn = sqlite3.connect(db)
-
-        with conn:
-            conn.row_factory = sqlite3.Row
-            cur = conn.cursor()
-
-            cur.execute(
-                "SELECT * FROM friendRestriction WHERE profile_id=:id_var "
-                "AND username=:name_var",
-                {"id_var": id, "name_var": username},
-            )
-            data = cur.fetchone()
-            friend_data = dict(data) if data else None
-
-            if operation == "write":
-                if friend_data is None:
-                    # write a new record
-                    cur.execute(
-                        "INSERT INTO friendRestriction (profile_id, "
-                        "username, times) VALUES (?, ?, ?)",
-                        (id, username, 1),
-                    )
-                else:
-                    # update the existing record
-                    friend_data["times"] += 1
-                    sql = (
-                        "UPDATE friendRestriction set times = ? WHERE "
-                        "profile_id=? AND username = ?"
-                    )
-                    cur.execute(sql, (friend_data["times"], id, username))
+        cache = get_restriction_cache(Settings)
 
-                # commit the latest changes
-                conn.commit()
+        if operation == "write":
+            cache.write("friendRestriction", (username,))
 
-            elif operation == "read":
-                if friend_data is None:
-                    return False
+        elif operation == "read":
+            times = cache.times("friendRestriction", (username,))
 
-                elif friend_data["times"] < limit:
-                    return False
+            if not times or times < limit:
+                return False
 
-                else:
-                    exceed_msg = "" if friend_data["times"] == limit else "more than "
-                    logger.info(
-                        "---> {} has already been friended {}{} times".format(
-                            username, exceed_msg, str(limit)
-                        )
+            else:
+                exceed_msg = "" if times == limit else "more than "
+                logger.info(
+                    "---> {} has already been friended {}{} times".format(
+                        username, exceed_msg, str(limit)
                     )
-                    return True
+                )
+                return True
 
     except Exception as exc:
         logger.error(
@@ -307,10 +280,30 @@ def friend_restriction(operation, username, limit, logger):
             )
         )
 
-    finally:
-        if conn:
-            # close the open connection
-            conn.close()
+
+def filter_friend_restricted(usernames, limit, logger):
+    """ Drop the users which have already been friended `limit` times, with a
+    single look-up for the whole list """
+    try:
+        cache = get_restriction_cache(Settings)
+        eligible = cache.eligible("friendRestriction", usernames, limit)
+
+    except Exception as exc:
+        logger.error(
+            "Dap! Error occurred while filtering by friend Restriction:\n\t{}".format(
+                str(exc).encode("utf-8")
+            )
+        )
+        return usernames
+
+    if len(eligible) < len(usernames):
+        logger.info(
+            "---> Skipping {} of {} users already friended {} times".format(
+                len(usernames) - len(eligible), len(usernames), limit
+            )
+        )
+
+    return eligible
 
 
 def confirm_unfriend(browser):
@@ -322,7 +315,11 @@ def confirm_unfriend(browser):
             attempt += 1
             button_xp = "//button[text()='Unfollow']"  # "//button[contains(
             # text(), 'Unfollow')]"
-            unfollow_button = browser.find_element_by_xpath(button_xp)
+            # the dialog may not show up at all, retry instead of waiting
+            # the whole `page_delay` each time
+            unfollow_button = probe_one(browser, button_xp)
+            if unfollow_button is None:
+                raise NoSuchElementException(button_xp)
 
             if unfollow_button.is_displayed():
                 click_element(browser, Settings, unfollow_button)
@@ -0,0 +1,151 @@
+""" Module which waits for page states instead of sleeping a fixed time """
+from contextlib import contextmanager
+from functools import wraps
+import time
+
+from selenium.common.exceptions import StaleElementReferenceException
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+# count the nodes matching a CSS selector or an XPath, through a script so
+# that the implicit wait of the browser doesn't hold the polls up
+COUNT_NODES_SCRIPT = """
+    if (arguments[1] === "xpath") {
+        return document.evaluate(
+            arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null
+        ).snapshotLength;
+    }
+    return document.querySelectorAll(arguments[0]).length;
+"""
+
+DIALOG_OPEN_SCRIPT = """
+    var dialog = document.evaluate(
+        arguments[0], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null
+    ).singleNodeValue;
+    return dialog !== null && dialog.offsetParent !== null;
+"""
+
+
+def list_rendered(locator, by="css", count=1):
+    """ At least `count` nodes of the list are in the page """
+
+    def condition(browser):
+        return browser.execute_script(COUNT_NODES_SCRIPT, locator, by) >= count
+
+    return condition
+
+
+def dialog_open(xpath):
+    """ The dialog is in the page and displayed """
+
+    def condition(browser):
+        return browser.execute_script(DIALOG_OPEN_SCRIPT, xpath)
+
+    return condition
+
+
+def button_state_changed(button, text):
+    """ The text of the button isn't `text` anymore, or it was replaced """
+
+    def condition(browser):
+        try:
+            return button.text != text
+
+        except StaleElementReferenceException:
+            return True
+
+    return condition
+
+
+CONDITIONS = {
+    "list rendered": list_rendered,
+    "dialog open": dialog_open,
+    "button state changed": button_state_changed,
+}
+
+# the features being run, innermost last, as [name, start time, time spent
+# in nested features, time spent waiting]
+feature_stack = []
+
+# the "wait" and "work" seconds and the count of "waits" of each feature
+feature_times = {}
+
+
+def current_feature():
+    """ Return the name of the innermost feature being run, if any """
+    return feature_stack[-1][0] if feature_stack else None
+
+
+def get_feature_times(name):
+    return feature_times.setdefault(name, {"wait": 0.0, "work": 0.0, "waits": 0})
+
+
+@contextmanager
+def feature(name):
+    """ Account the time of the block to the feature `name`; the time of
+    nested features goes to them only """
+    feature_stack.append([name, time.time(), 0.0, 0.0])
+    try:
+        yield
+
+    finally:
+        name, start_time, nested_time, waited = feature_stack.pop()
+        elapsed = time.time() - start_time
+        get_feature_times(name)["work"] += elapsed - nested_time - waited
+
+        if feature_stack:
+            feature_stack[-1][2] += elapsed
+
+
+def timed_feature(func):
+    """ Account the time of every call of `func` to the feature of its name """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with feature(func.__name__):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def wait_for(browser, condition, *args, **kwargs):
+    """
+    Wait until the named condition holds, at most `timeout` seconds
+    (10 by default), and tell if it did.
+
+    The waited time is accounted to the current feature.
+    """
+    timeout = kwargs.pop("timeout", 10)
+    start_time = time.time()
+
+    try:
+        WebDriverWait(browser, timeout, poll_frequency=0.25).until(
+            CONDITIONS[condition](*args, **kwargs)
+        )
+        held = True
+
+    except TimeoutException:
+        held = False
+
+    if feature_stack:
+        waited = time.time() - start_time
+        feature_stack[-1][3] += waited
+        times = get_feature_times(current_feature())
+        times["wait"] += waited
+        times["waits"] += 1
+
+    return held
+
+
+def feature_time_report():
+    """ Return a line with the wait and work time of each feature """
+    return [
+        "{}: waited {:.2f}s in {} waits, worked {:.2f}s".format(
+            name, times["wait"], times["waits"], times["work"]
+        )
+        for name, times in sorted(feature_times.items())
+    ]
+
+
+def clear_feature_times():
+    feature_times.clear()
@@ -0,0 +1,128 @@
+""" Module which queues the harvested candidates until they are acted on """
+from datetime import datetime
+
+from .database_engine import get_database
+from .database_engine import get_connection
+from .database_engine import INSERT_CANDIDATE
+from .database_engine import SELECT_CANDIDATES_IN_STATE
+from .database_engine import COUNT_CANDIDATES_BY_STATE
+from .database_engine import UPDATE_CANDIDATE_STATE
+from .database_engine import RELEASE_CLAIMED_CANDIDATES
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# the states of a candidate, from harvested to acted on
+PENDING = "pending"
+CLAIMED = "claimed"
+DONE = "done"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+def timestamp():
+    return datetime.now().strftime(TIMESTAMP_FORMAT)
+
+
+class WorkQueue:
+    """
+    Keep the candidates the features harvest, e.g. the followers of a user
+    or the members of a group, in the `candidateQueue` table until acted on.
+
+    Harvesters enqueue the candidates of a source; the action stages claim a
+    batch of them and mark each one as done, skipped or failed. A candidate
+    is queued once per source, so harvesting a source again only adds the
+    new ones, and an interrupted run picks up the pending ones next time.
+    """
+
+    def __init__(self, address, profile_id):
+        self.address = address
+        self.profile_id = profile_id
+
+    def enqueue(self, source, candidates):
+        """ Queue the candidates of the source, return how many were new """
+        now = timestamp()
+        conn = get_connection(self.address)
+        with conn:
+            before = conn.total_changes
+            conn.executemany(
+                INSERT_CANDIDATE,
+                (
+                    (self.profile_id, source, candidate, now, now)
+                    for candidate in candidates
+                ),
+            )
+            return conn.total_changes - before
+
+    def counts(self, source):
+        """ Return the number of candidates of the source in each state """
+        conn = get_connection(self.address)
+        with conn:
+            cur = conn.cursor()
+            cur.execute(COUNT_CANDIDATES_BY_STATE, (self.profile_id, source))
+            return {row["state"]: row["candidates"] for row in cur}
+
+    def pending(self, source):
+        return self.counts(source).get(PENDING, 0)
+
+    def claim(self, source, limit):
+        """ Take up to `limit` pending candidates of the source, the earliest
+        queued first """
+        now = timestamp()
+        conn = get_connection(self.address)
+        with conn:
+            cur = conn.cursor()
+            cur.execute(
+                SELECT_CANDIDATES_IN_STATE, (self.profile_id, source, PENDING, limit)
+            )
+            candidates = [row["candidate"] for row in cur]
+            cur.executemany(
+                UPDATE_CANDIDATE_STATE,
+                (
+                    (CLAIMED, now, self.profile_id, source, candidate)
+                    for candidate in candidates
+                ),
+            )
+
+        return candidates
+
+    def finish(self, source, candidates, state=DONE):
+        """ Mark the claimed candidates as acted on """
+        if not isinstance(candidates, (list, tuple, set)):
+            candidates = [candidates]
+
+        now = timestamp()
+        conn = get_connection(self.address)
+        with conn:
+            conn.executemany(
+                UPDATE_CANDIDATE_STATE,
+                (
+                    (state, now, self.profile_id, source, candidate)
+                    for candidate in candidates
+                ),
+            )
+
+    def release(self):
+        """ Put the candidates claimed by an interrupted run back in line """
+        conn = get_connection(self.address)
+        with conn:
+            cur = conn.cursor()
+            cur.execute(RELEASE_CLAIMED_CANDIDATES, (timestamp(), self.profile_id))
+            return cur.rowcount
+
+
+# queues of the profiles used in this process, by DB address and profile id
+queues = {}
+
+
+def get_work_queue(Settings):
+    """ Get the work queue of the current profile; the candidates claimed
+    but not finished by a previous process go back in line first """
+    address, profile_id = get_database(Settings)
+
+    queue = queues.get((address, profile_id))
+    if queue is None:
+        queue = WorkQueue(address, profile_id)
+        queue.release()
+        queues[(address, profile_id)] = queue
+
+    return queue
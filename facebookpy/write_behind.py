@@ -0,0 +1,214 @@
+""" Module which batches the DB writes of a session in the background """
+import sqlite3
+import threading
+
+from .database_engine import get_connection
+
+# `PRAGMA synchronous` value of each durability level;
+# with WAL journaling, "normal" can lose the last commits on a power loss
+# (never on a crash of the process) and "off" leaves the syncing to the OS
+DURABILITY_LEVELS = {"off": "OFF", "normal": "NORMAL", "full": "FULL"}
+
+
+def is_transient(exc):
+    """ Tell if the write may go through when tried again, e.g. once another
+    connection lets go of its lock on the DB """
+    message = str(exc).lower()
+    return isinstance(exc, sqlite3.OperationalError) and (
+        "locked" in message or "busy" in message
+    )
+
+
+class WriteBehindQueue:
+    """
+    Collect DB writes and commit them in batches from a background thread.
+
+    Pending writes are committed in a single transaction every
+    `flush_interval` milliseconds, or as soon as `batch_size` of them are
+    waiting. A batch the DB refused for the time being, e.g. as it was
+    locked, goes back in line and is tried again with the next flush, up to
+    `max_retries` times. A batch failing otherwise is written again one write
+    at a time, so only the failing writes are lost. Whatever is still pending when the process gets
+    killed is lost, so `stop()` (or at least `flush()`) must be called
+    before leaving.
+    """
+
+    def __init__(
+        self,
+        address,
+        flush_interval=500,
+        batch_size=100,
+        durability="normal",
+        logger=None,
+        max_retries=3,
+    ):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(
+                "Unknown durability level '{}', use one of: {}".format(
+                    durability, ", ".join(sorted(DURABILITY_LEVELS))
+                )
+            )
+
+        self.address = address
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.durability = durability
+        self.logger = logger
+        self.max_retries = max_retries
+
+        self.pending = []
+        # the failed attempts at writing the batch at the front of the line
+        self.retries = 0
+        self.condition = threading.Condition()
+        # only one batch gets written at a time, by either thread
+        self.write_lock = threading.Lock()
+        self.stopping = False
+        self.connection = None
+        self.thread = None
+
+    def start(self):
+        self.connection = sqlite3.connect(
+            self.address, timeout=30, check_same_thread=False
+        )
+        # let the session's readers go on while batches are being written
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "PRAGMA synchronous={}".format(DURABILITY_LEVELS[self.durability])
+        )
+
+        self.thread = threading.Thread(target=self.run, name="facebookpy-write-behind")
+        self.thread.daemon = True
+        self.thread.start()
+
+        return self
+
+    def put(self, sql, params):
+        """ Queue a write to be committed with the next batch """
+        with self.condition:
+            self.pending.append((sql, params))
+
+            if len(self.pending) >= self.batch_size:
+                self.condition.notify()
+
+    def flush(self):
+        """ Commit all the pending writes right now """
+        with self.write_lock:
+            with self.condition:
+                batch, self.pending = self.pending, []
+
+            if not batch:
+                return 0
+
+            try:
+                with self.connection:
+                    for sql, params in batch:
+                        self.connection.execute(sql, params)
+
+            except sqlite3.Error as exc:
+                if is_transient(exc) and self.retries < self.max_retries:
+                    self.retries += 1
+                    # keep the order of the writes, the batch goes first
+                    with self.condition:
+                        self.pending = batch + self.pending
+
+                    if self.logger:
+                        self.logger.warning(
+                            "Couldn't write {} queued DB records, will try "
+                            "again:\n\t{}".format(len(batch), str(exc).encode("utf-8"))
+                        )
+                    return 0
+
+                self.retries = 0
+                return self.write_one_by_one(batch)
+
+            self.retries = 0
+            return len(batch)
+
+    def write_one_by_one(self, batch):
+        """ Write the batch one write per transaction, dropping the failing
+        ones only """
+        written = 0
+        for sql, params in batch:
+            try:
+                with self.connection:
+                    self.connection.execute(sql, params)
+                written += 1
+
+            except sqlite3.Error as exc:
+                if self.logger:
+                    self.logger.error(
+                        "Oops! Error occurred while writing a queued DB "
+                        "record:\n\t{}".format(str(exc).encode("utf-8"))
+                    )
+
+        return written
+
+    def run(self):
+        while True:
+            with self.condition:
+                if not self.stopping and len(self.pending) < self.batch_size:
+                    self.condition.wait(self.flush_interval / 1000.0)
+                stopping = self.stopping
+
+            self.flush()
+
+            if stopping:
+                break
+
+    def stop(self):
+        """ Commit what is left, then shut the background writer down """
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+
+        if self.thread is not None:
+            self.thread.join()
+
+        # a batch held back gets its retries right away, then is given up
+        while self.pending:
+            self.flush()
+        self.connection.close()
+
+
+# the write-behind queue of the session, if enabled
+write_queue = None
+
+
+def start_write_behind(
+    address, flush_interval=500, batch_size=100, durability="normal", logger=None
+):
+    """ Route the DB writes of `execute_write()` through a write-behind queue """
+    global write_queue
+
+    stop_write_behind()
+    write_queue = WriteBehindQueue(
+        address, flush_interval, batch_size, durability, logger
+    ).start()
+
+    return write_queue
+
+
+def flush_write_behind():
+    """ Commit the pending writes of the write-behind queue, if any """
+    if write_queue is not None:
+        write_queue.flush()
+
+
+def stop_write_behind():
+    """ Commit the pending writes and go back to writing synchronously """
+    global write_queue
+
+    if write_queue is not None:
+        queue, write_queue = write_queue, None
+        queue.stop()
+
+
+def execute_write(address, sql, params):
+    """ Write to the DB either right away or through the write-behind queue """
+    if write_queue is not None and write_queue.address == address:
+        write_queue.put(sql, params)
+
+    else:
+        conn = get_connection(address)
+        with conn:
+            conn.execute(sql, params)